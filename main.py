@@ -1,9 +1,23 @@
 import asyncio
 import aiohttp
+import codecs
+import collections
+import concurrent.futures
+import hashlib
+import itertools
 import json
+import multiprocessing
 import os
+import queue
+import random
 import re
-from datetime import datetime
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from aiohttp import web
+from datetime import datetime, timedelta
 
 try:
     import nest_asyncio
@@ -12,9 +26,897 @@ try:
 except ImportError:
     print("⚠️ Установите: pip install nest-asyncio")
 
+class EsolllHTTPClient:
+    """🔌 Общий пул HTTP-соединений для Telegram, MPStats и Anthropic"""
+    def __init__(self, limit=100, limit_per_host=30, keepalive_timeout=75, dns_cache_ttl=300):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.session = None
+    
+    async def get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+    
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            # Даем SSL-соединениям корректно закрыться
+            await asyncio.sleep(0.25)
+        self.session = None
+
+class EsolllMPStatsUnavailable(Exception):
+    """MPStats не отвечает: исчерпаны повторы или открыт circuit breaker"""
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class EsolllCircuitBreaker:
+    """🔌 Circuit breaker для внешнего API: closed -> open на reset_timeout -> half_open"""
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+    
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+    
+    def allow(self):
+        state = self.state()
+        if state == 'closed':
+            return True
+        if state == 'open':
+            return False
+        now = time.monotonic()
+        # Пробный запрос, который не вернулся (например, отменен), не блокирует breaker навсегда
+        if self.probe_started is None or now - self.probe_started >= self.reset_timeout:
+            self.probe_started = now
+            return True
+        return False
+    
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(0, self.opened_at + self.reset_timeout - time.monotonic())
+    
+    def record_success(self):
+        if self.opened_at is not None:
+            print(f"✅ {self.name}: сервис снова отвечает, circuit breaker закрыт")
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+    
+    def record_failure(self):
+        self.failures += 1
+        self.probe_started = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(f"🔌 {self.name}: {self.failures} ошибок подряд, circuit breaker открыт на {self.reset_timeout} сек")
+            self.opened_at = time.monotonic()
+
+class EsolllTTLCache:
+    """🗃️ LRU-кэш с TTL и stale-while-revalidate"""
+    def __init__(self, ttl=1800, stale_ttl=6 * 3600, max_size=1000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.fallbacks = 0
+    
+    def get(self, key):
+        """Значение и его состояние: 'fresh', 'stale', 'expired' или None, если записи нет"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, None
+        value, stored_at = entry
+        age = time.monotonic() - stored_at
+        self.entries.move_to_end(key)
+        if age <= self.ttl:
+            return value, 'fresh'
+        if age <= self.ttl + self.stale_ttl:
+            return value, 'stale'
+        return value, 'expired'
+    
+    def set(self, key, value):
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    async def get_or_load(self, key, loader):
+        """loader(key) -> значение или None; None не кэшируется (товар не найден или ошибка API)"""
+        value, state = self.get(key)
+        if state == 'fresh':
+            self.hits += 1
+            return value
+        if state == 'stale':
+            self.stale_hits += 1
+            if key not in self.refreshing:
+                self.refreshing[key] = asyncio.create_task(self.refresh(key, loader))
+            return value
+        
+        self.misses += 1
+        try:
+            loaded = await loader(key)
+        except Exception as e:
+            if state != 'expired':
+                raise
+            self.fallbacks += 1
+            print(f"⚠️ Источник недоступен ({e}), отдаю старую запись кэша для {key}")
+            return value
+        if loaded is not None:
+            self.set(key, loaded)
+        return loaded
+    
+    async def refresh(self, key, loader):
+        try:
+            value = await loader(key)
+            if value is not None:
+                self.set(key, value)
+                self.refreshes += 1
+        except Exception as e:
+            # Устаревшее значение остается в кэше до следующей попытки
+            print(f"⚠️ Не удалось обновить кэш для {key}: {e}")
+        finally:
+            self.refreshing.pop(key, None)
+    
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'fallbacks': self.fallbacks,
+            'hit_rate': round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0
+        }
+
+class EsolllReview:
+    """💬 Отзыв покупателя: один компактный объект для парсера, анализатора и отчета"""
+    __slots__ = ('text', 'rating', 'date', 'answer', '_lower_text', '_short_text')
+    
+    ALIASES = {'review_text': 'text', 'review_rating': 'rating', 'valuation': 'rating'}
+    FIELDS = ('text', 'rating', 'date', 'answer', 'lower_text', 'short_text')
+    
+    def __init__(self, text, rating=5, date='', answer=''):
+        self.text = text
+        self.rating = rating
+        self.date = date
+        self.answer = answer or ''
+        self._lower_text = None
+        self._short_text = None
+    
+    @classmethod
+    def from_comment(cls, comment):
+        """Из сырого отзыва MPStats"""
+        return cls(comment.get('text', ''), comment.get('valuation', 5), comment.get('date', ''), comment.get('answer', ''))
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Из словаря чекпоинта журнала или старого формата с дублирующимися ключами"""
+        if isinstance(data, cls):
+            return data
+        return cls(
+            data.get('text', data.get('review_text', '')),
+            data.get('rating', data.get('review_rating', data.get('valuation', 5))),
+            data.get('date', ''),
+            data.get('answer', '')
+        )
+    
+    def to_dict(self):
+        return {'text': self.text, 'rating': self.rating, 'date': self.date, 'answer': self.answer}
+    
+    @staticmethod
+    def json_default(obj):
+        """default= для json.dumps: отзывы в чекпоинтах сохраняются компактными словарями"""
+        if isinstance(obj, EsolllReview):
+            return obj.to_dict()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    
+    @property
+    def lower_text(self):
+        if self._lower_text is None:
+            self._lower_text = self.text.lower()
+        return self._lower_text
+    
+    @property
+    def short_text(self):
+        if self._short_text is None:
+            self._short_text = self.text[:250] + "..." if len(self.text) > 250 else self.text
+        return self._short_text
+    
+    def get(self, key, default=None):
+        key = self.ALIASES.get(key, key)
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return default
+    
+    def __getitem__(self, key):
+        key = self.ALIASES.get(key, key)
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+    
+    def __contains__(self, key):
+        return self.ALIASES.get(key, key) in self.FIELDS
+    
+    def __getstate__(self):
+        return (self.text, self.rating, self.date, self.answer)
+    
+    def __setstate__(self, state):
+        self.__init__(*state)
+    
+    def __repr__(self):
+        return f"EsolllReview(rating={self.rating!r}, date={self.date!r}, text={self.text[:40]!r})"
+
+def is_usable_comment(comment, min_length=15):
+    """Отзыв пригоден для анализа: есть текст не короче min_length символов (ESOLLL_MIN_REVIEW_LENGTH)"""
+    text = comment.get('text')
+    return bool(text) and len(text.strip()) >= min_length
+
+class EsolllReviewSampler:
+    """🎯 Стратифицированная выборка отзывов (оценка × возраст) за один проход"""
+    AGE_BUCKETS = (30, 90, 365)  # Границы возраста отзыва, дни
+    
+    def __init__(self, size=120, seed=None, now=None, age_buckets=AGE_BUCKETS):
+        self.size = size
+        # seed = артикул: повторный анализ тех же отзывов дает ту же выборку
+        self.random = random.Random(seed)
+        now = now or datetime.now()
+        # Даты ISO сравниваются строками - без разбора каждой даты
+        self.age_cutoffs = [(now - timedelta(days=days)).strftime('%Y-%m-%d') for days in age_buckets]
+        self.reservoirs = {}
+        self.counts = collections.Counter()
+        self.seen = 0
+    
+    def stratum(self, review):
+        rating = review.get('valuation', review.get('rating', 5))
+        try:
+            rating = min(5, max(1, int(rating)))
+        except (TypeError, ValueError):
+            rating = 5
+        date = (review.get('date') or '')[:10]
+        age = sum(1 for cutoff in self.age_cutoffs if date < cutoff)
+        return rating, age
+    
+    def add(self, review):
+        key = self.stratum(review)
+        self.seen += 1
+        self.counts[key] += 1
+        reservoir = self.reservoirs.setdefault(key, [])
+        if len(reservoir) < self.size:
+            reservoir.append(review)
+        else:
+            slot = self.random.randrange(self.counts[key])
+            if slot < self.size:
+                reservoir[slot] = review
+    
+    def extend(self, reviews):
+        for review in reviews:
+            self.add(review)
+        return self
+    
+    def allocation(self):
+        """Мест на страту: пропорционально числу отзывов, остаток - по наибольшим дробным частям"""
+        if self.seen <= self.size:
+            return dict(self.counts)
+        quotas = {key: count * self.size / self.seen for key, count in self.counts.items()}
+        places = {key: int(quota) for key, quota in quotas.items()}
+        remaining = self.size - sum(places.values())
+        for key in sorted(quotas, key=lambda key: quotas[key] - places[key], reverse=True)[:remaining]:
+            places[key] += 1
+        return places
+    
+    def sample(self):
+        """Итоговая выборка, от новых отзывов к старым"""
+        sample = []
+        for key, places in sorted(self.allocation().items()):
+            reservoir = self.reservoirs[key]
+            sample.extend(reservoir if places >= len(reservoir) else self.random.sample(reservoir, places))
+        sample.sort(key=lambda review: review.get('date') or '', reverse=True)
+        return sample
+
+class EsolllCommentsStream:
+    """🌊 Потоковый разбор массива "comments" из ответа MPStats по кускам байтов"""
+    STRUCTURE = re.compile(r'["{}\[\]]')
+    STRING_TAIL = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    SEPARATORS = ' \t\r\n,'
+    SCALAR_END = ' \t\r\n,]'
+    
+    def __init__(self, key='comments'):
+        self.key = key
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.text = ''
+        self.pos = 0
+        self.depth = 0
+        # seek -> key -> value -> array; found - ключ найден, done - массив закончился
+        self.state = 'seek'
+        self.found = False
+        self.done = False
+    
+    def skip(self, chars):
+        while self.pos < len(self.text) and self.text[self.pos] in chars:
+            self.pos += 1
+        return self.pos < len(self.text)
+    
+    def feed(self, data):
+        self.text += self.decoder.decode(data)
+        items = []
+        
+        while not self.done:
+            if self.state == 'array':
+                if not self.skip(self.SEPARATORS):
+                    break
+                if self.text[self.pos] == ']':
+                    self.done = True
+                    break
+                try:
+                    item, end = self.json_decoder.raw_decode(self.text, self.pos)
+                except ValueError:
+                    # Элемент пришел не целиком - ждем следующий кусок
+                    break
+                if not isinstance(item, (dict, list, str)) and (end >= len(self.text) or self.text[end] not in self.SCALAR_END):
+                    # Число на границе куска может оказаться неполным: "3." из "3.25" - ждем разделитель
+                    break
+                items.append(item)
+                self.pos = end
+                continue
+            
+            if self.state == 'key':
+                # Строка "comments" - ключ, только если за ней двоеточие
+                if not self.skip(' \t\r\n'):
+                    break
+                if self.text[self.pos] == ':':
+                    self.pos += 1
+                    self.state = 'value'
+                else:
+                    self.state = 'seek'
+                continue
+            
+            if self.state == 'value':
+                if not self.skip(' \t\r\n'):
+                    break
+                self.found = True
+                if self.text[self.pos] == '[':
+                    self.pos += 1
+                    self.state = 'array'
+                    continue
+                # "comments": null или другое не-массивное значение
+                self.done = True
+                break
+            
+            match = self.STRUCTURE.search(self.text, self.pos)
+            if match is None:
+                self.pos = len(self.text)
+                break
+            i = match.start()
+            char = self.text[i]
+            
+            if char == '"':
+                tail = self.STRING_TAIL.match(self.text, i + 1)
+                if tail is None:
+                    # Строка не закончилась - дочитаем ее со следующим куском
+                    self.pos = i
+                    break
+                self.pos = tail.end()
+                if self.depth == 1 and self.text[i + 1:self.pos - 1] == self.key:
+                    self.state = 'key'
+            elif char in '{[':
+                self.depth += 1
+                self.pos = i + 1
+            else:
+                self.depth -= 1
+                self.pos = i + 1
+        
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        return items
+    
+    def close(self):
+        """Конец ответа: массив, который не закончился, - ошибка, а не часть отзывов"""
+        self.text += self.decoder.decode(b'', final=True)
+        if self.found and not self.done:
+            raise ValueError(f"ответ оборван или не JSON внутри массива \"{self.key}\": {self.text[:40]!r}")
+
+class EsolllReviewStore:
+    """🗄️ Локальное SQLite-хранилище отзывов MPStats с отметкой самой новой даты"""
+    def __init__(self, path='esolll_reviews.sqlite3', sync_interval=600, min_review_length=15):
+        self.path = path
+        # Более короткие отзывы не сохраняются: после снижения порога они появятся только среди новых
+        self.min_review_length = min_review_length
+        # Чаще sync_interval секунд MPStats по одному артикулу не опрашиваем
+        self.sync_interval = sync_interval
+        # Запросы идут из потоков asyncio.to_thread: соединение одно, доступ к нему по очереди
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                article_id TEXT NOT NULL,
+                review_key TEXT NOT NULL,
+                date TEXT NOT NULL,
+                rating INTEGER,
+                text TEXT NOT NULL,
+                answer TEXT,
+                PRIMARY KEY (article_id, review_key)
+            );
+            CREATE INDEX IF NOT EXISTS reviews_article_date ON reviews (article_id, date);
+            CREATE TABLE IF NOT EXISTS review_sync (
+                article_id TEXT PRIMARY KEY,
+                high_water TEXT NOT NULL,
+                synced_at REAL NOT NULL
+            );
+        """)
+    
+    @staticmethod
+    def review_key(comment):
+        if comment.get('id') is not None:
+            return str(comment['id'])
+        raw = f"{comment.get('date', '')}|{comment.get('text', '')}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def sync_state(self, article_id):
+        """(high_water, synced_at) или (None, 0), если артикул еще не загружался"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT high_water, synced_at FROM review_sync WHERE article_id = ?", (article_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+    
+    def needs_sync(self, article_id):
+        high_water, synced_at = self.sync_state(article_id)
+        return high_water is None or time.time() - synced_at >= self.sync_interval
+    
+    def add_comments(self, article_id, comments, high_water=None):
+        """Сохраняет отзывы MPStats и сдвигает отметку даты; возвращает число новых отзывов"""
+        rows = [
+            (article_id, self.review_key(c), c.get('date', ''), c.get('valuation', 5), c.get('text', ''), c.get('answer', ''))
+            for c in comments if is_usable_comment(c, self.min_review_length)
+        ]
+        new_high_water = max([c.get('date') or '' for c in comments] + [high_water or ''])
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO reviews (article_id, review_key, date, rating, text, answer) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                added = self.conn.total_changes - before
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO review_sync (article_id, high_water, synced_at) VALUES (?, ?, ?)",
+                    (article_id, new_high_water, time.time())
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return added
+    
+    def iter_reviews(self, article_id, limit=None):
+        """Отзывы от новых к старым курсором, без загрузки всех строк в память"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT text, rating, date, answer FROM reviews WHERE article_id = ? ORDER BY date DESC LIMIT ?",
+                (article_id, -1 if limit is None else limit)
+            )
+            for text, rating, date, answer in rows:
+                yield EsolllReview(text, rating, date, answer)
+    
+    def sample_reviews(self, article_id, sampler, limit=None):
+        """Стратифицированная выборка из сохраненных отзывов (для asyncio.to_thread)"""
+        return sampler.extend(self.iter_reviews(article_id, limit)).sample()
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class EsolllKeywordAutomaton:
+    """🔎 Поиск всех ключевых слов словаря категорий за один проход по тексту"""
+    _compiled = {}
+    HITS_CACHE_SIZE = 4096
+    
+    @classmethod
+    def for_groups(cls, groups):
+        key = tuple((name, tuple(keywords)) for name, keywords in groups.items())
+        automaton = cls._compiled.get(key)
+        if automaton is None:
+            automaton = cls._compiled[key] = cls(groups)
+        return automaton
+    
+    def __init__(self, groups):
+        self.groups = list(groups)
+        # Слово -> номера групп; повтор слова в группе считается дважды, как в sum(... for keyword in keywords)
+        self.keyword_groups = collections.defaultdict(list)
+        for index, keywords in enumerate(groups.values()):
+            for keyword in keywords:
+                self.keyword_groups[keyword].append(index)
+        keywords = sorted(self.keyword_groups)
+        self.prefixes = {keyword: [other for other in keywords if keyword.startswith(other)] for keyword in keywords}
+        self.pattern = re.compile(self.trie_pattern(keywords)) if keywords else None
+        # Наборов найденных слов немного - разбивка по группам запоминается
+        self.hits_cache = {}
+    
+    @staticmethod
+    def trie_pattern(keywords):
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+        
+        def compile_node(node):
+            # Продолжения пробуются раньше конца слова - совпадение всегда самое длинное
+            branches = [re.escape(char) + compile_node(child) for char, child in node.items() if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            return f'(?:{body})?' if '' in node else body
+        
+        return compile_node(trie)
+    
+    def find(self, text):
+        """Множество слов, встречающихся в тексте (текст уже в нижнем регистре)"""
+        found = set()
+        if self.pattern is None:
+            return found
+        search = self.pattern.search
+        match = search(text)
+        while match:
+            found.update(self.prefixes[match.group()])
+            match = search(text, match.start() + 1)
+        return found
+    
+    def hits(self, text):
+        """{группа: число разных найденных слов} только для групп с совпадениями, в порядке словаря"""
+        found = frozenset(self.find(text))
+        hits = self.hits_cache.get(found)
+        if hits is None:
+            counts = collections.Counter(index for keyword in found for index in self.keyword_groups[keyword])
+            hits = {self.groups[index]: counts[index] for index in sorted(counts)}
+            if len(self.hits_cache) >= self.HITS_CACHE_SIZE:
+                self.hits_cache.clear()
+            self.hits_cache[found] = hits
+        # Словарь общий для одинаковых наборов найденных слов - вызывающий код его не меняет
+        return hits
+
+class EsolllLanguageDetector:
+    """🔤 Русский ли отзыв: доля русских букв (включая ё) среди всех букв текста"""
+    RUSSIAN_LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+    RUSSIAN_RUNS = re.compile('[а-яёА-ЯЁ]+')
+    # Таблицы удаления для bytes.translate: все байты cp1251, кроме русских букв / кроме любых букв
+    NOT_RUSSIAN_BYTES = bytes(sorted(set(range(256)) - set(RUSSIAN_LETTERS.encode('cp1251'))))
+    NOT_LETTER_BYTES = bytes(filter(lambda byte: not bytes([byte]).decode('cp1251', 'ignore').isalpha(), range(256)))
+    
+    def __init__(self, threshold=0.5, min_length=15):
+        # Русским считается текст, где доля русских букв больше threshold
+        self.threshold = threshold
+        self.min_length = min_length
+    
+    def counts(self, text):
+        """(русских букв, всего букв)"""
+        try:
+            encoded = text.encode('cp1251')
+        except UnicodeEncodeError:
+            return sum(map(len, self.RUSSIAN_RUNS.findall(text))), sum(map(str.isalpha, text))
+        return len(encoded.translate(None, self.NOT_RUSSIAN_BYTES)), len(encoded.translate(None, self.NOT_LETTER_BYTES))
+    
+    def russian_share(self, text):
+        russian_chars, total_chars = self.counts(text)
+        return russian_chars / total_chars if total_chars else 0.0
+    
+    def is_russian(self, text):
+        russian_chars, total_chars = self.counts(text)
+        return total_chars > 0 and russian_chars / total_chars > self.threshold
+    
+    def accepts(self, text):
+        """Отзыв годится для анализа: не короче min_length символов и русский"""
+        return bool(text) and len(text.strip()) >= self.min_length and self.is_russian(text)
+    
+    def classify(self, texts):
+        """accepts() для пачки текстов"""
+        counts = self.counts
+        threshold = self.threshold
+        min_length = self.min_length
+        verdicts = []
+        for text in texts:
+            if not text or len(text.strip()) < min_length:
+                verdicts.append(False)
+                continue
+            russian_chars, total_chars = counts(text)
+            verdicts.append(total_chars > 0 and russian_chars / total_chars > threshold)
+        return verdicts
+
+class EsolllReviewVerdict:
+    """Результат разбора одного отзыва движком EsolllReviewEngine"""
+    __slots__ = ('review', 'bucket', 'problem', 'critical')
+    
+    def __init__(self, review, bucket, problem, critical):
+        self.review = review
+        self.bucket = bucket
+        self.problem = problem
+        self.critical = critical
+
+class EsolllReviewEngine:
+    """⚙️ Разбор отзывов за один проход по тексту"""
+    NEGATIVE_INDICATORS = ['плохо', 'ужасно', 'отвратительно', 'разочарован', 'жалею', 'верните',
+                           'не рекомендую', 'не советую', 'бред', 'фигня', 'отстой', 'развод',
+                           'кошмар', 'ужас', 'деньги на ветер', 'обман', 'подделка']
+    def __init__(self, problems, smart_problems, language=None):
+        self.language = language or EsolllLanguageDetector()
+        # Группы с пространством имен: одинаковые названия в разных словарях не сливаются
+        groups = {('problems', name): keywords for name, keywords in problems.items()}
+        groups.update({('smart', name): keywords for name, keywords in smart_problems.items()})
+        groups[('negative', None)] = self.NEGATIVE_INDICATORS
+        self.automaton = EsolllKeywordAutomaton.for_groups(groups)
+    
+    @classmethod
+    def for_product(cls, problems, product_name, language=None):
+        return cls(problems, cls.smart_problem_categories(product_name), language)
+    
+    @staticmethod
+    def smart_problem_categories(product_name):
+        """Умная категоризация проблем в зависимости от товара"""
+        product_lower = product_name.lower()
+        
+        if any(word in product_lower for word in ["сушилка", "центрифуга", "салат"]):
+            return {
+                "Проблемы сушки": ["не сушит", "плохо сушит", "мокрый", "влажный", "не высыхает"],
+                "Механизм вращения": ["не крутится", "слабо крутится", "заедает", "тормозит", "медленно"],
+                "Размер корзины": ["маленькая", "большая", "не помещается", "мало места"],
+                "Качество сборки": ["разваливается", "хлипкий", "неустойчивый", "шатается"],
+                "Материалы": ["пластик", "тонкий", "хрупкий", "некачественный материал"]
+            }
+        elif any(word in product_lower for word in ["наушники", "bluetooth", "tws"]):
+            return {
+                "Качество звука": ["тихий", "искажения", "басы", "звук плохой", "шипит"],
+                "Bluetooth связь": ["не подключается", "отключается", "теряет связь", "bluetooth"],
+                "Время работы": ["быстро разряжается", "не заряжается", "держит заряд", "батарея"],
+                "Комфорт": ["выпадают", "неудобные", "давят", "болят уши"],
+                "Микрофон": ["не слышно", "микрофон", "плохо слышат", "эхо"]
+            }
+        elif any(word in product_lower for word in ["зарядка", "кабель", "провод"]):
+            return {
+                "Скорость зарядки": ["медленно заряжает", "долго заряжается", "слабая зарядка"],
+                "Надежность": ["ломается", "отходит", "не заряжает", "перестал работать"],
+                "Размеры": ["короткий", "длинный", "не хватает длины"],
+                "Совместимость": ["не подходит", "не совместим", "не работает с"],
+                "Качество": ["тонкий", "дешевый", "рвется", "гнется"]
+            }
+        else:
+            return {
+                "Функциональность": ["не работает", "бракованный", "глючит", "сломался"],
+                "Качество": ["дешевый", "хрупкий", "некачественный", "плохой"],
+                "Размеры": ["размер", "маленький", "большой", "не подходит"],
+                "Сборка": ["разваливается", "неустойчивый", "хлипкий", "плохая сборка"],
+                "Материалы": ["материал", "пластик", "металл", "ткань"]
+            }
+    
+    def process(self, review):
+        """EsolllReviewVerdict для русского отзыва достаточной длины, иначе None"""
+        # Отзывы из чекпоинтов журнала приходят словарями
+        review = EsolllReview.from_dict(review)
+        if not self.language.accepts(review.text):
+            return None
+        return self.verdict(review)
+    
+    def verdict(self, review):
+        rating = review.rating
+        if rating <= 3:
+            bucket = 'critical'
+        elif rating >= 5:
+            bucket = 'positive'
+        else:
+            bucket = 'neutral'
+        
+        hits = self.automaton.hits(review.lower_text)
+        # Один отзыв = одна проблема анализа, первая по порядку словаря
+        problem = next((name for kind, name in hits if kind == 'problems'), None)
+        return EsolllReviewVerdict(review, bucket, problem, self.critical_candidate(review, hits))
+    
+    def analyze(self, reviews):
+        reviews = [EsolllReview.from_dict(review) for review in reviews]
+        accepted = self.language.classify([review.text for review in reviews])
+        return [self.verdict(review) for review, is_russian in zip(reviews, accepted) if is_russian]
+    
+    def critical_candidate(self, review, hits):
+        """Кандидат в критические отзывы с баллом критичности или None"""
+        rating = review.rating
+        text = review.text
+        
+        # Исключаем хорошие отзывы и слишком короткие
+        if rating >= 5 or len(text.strip()) < 30:
+            return None
+        
+        review_score = 0
+        matched_problems = []
+        
+        # Проблемы по категориям товара
+        for (kind, problem_category), matches in hits.items():
+            if kind != 'smart':
+                continue
+            matched_problems.append({
+                'name': problem_category,
+                'severity': 'высокая' if matches >= 2 else 'средняя',
+                'matches': matches
+            })
+            review_score += matches * 6  # Высокий вес за совпадения
+        
+        # Негативные индикаторы
+        review_score += hits.get(('negative', None), 0) * 4
+        
+        # Бонусы за рейтинг
+        if rating <= 2:
+            review_score += 20
+        elif rating == 3:
+            review_score += 15
+        elif rating == 4:
+            review_score += 8
+        
+        # Бонус за длину (больше деталей)
+        if len(text) > 100:
+            review_score += 5
+        if len(text) > 200:
+            review_score += 5
+        
+        # Минимальный порог для попадания
+        if review_score < 8:
+            return None
+        if not matched_problems:
+            matched_problems = [{'name': 'Общее недовольство', 'severity': 'средняя', 'matches': 1}]
+        
+        return {
+            'text': text,
+            'rating': rating,
+            'date': review.date,
+            'score': review_score,
+            'matched_problems': matched_problems
+        }
+
+class EsolllAnalysisResult(dict):
+    """📦 Результат анализа: словарь basic_analysis с ленивыми производными данными"""
+    VIEWS = ('problems', 'best_positive_reviews', 'worst_negative_reviews', 'critical_percentage',
+             'positive_percentage', 'top_critical_reviews')
+    
+    @classmethod
+    def wrap(cls, analysis):
+        """Анализ из чекпоинта журнала или старого формата - обычный словарь"""
+        return analysis if isinstance(analysis, cls) else cls(analysis)
+    
+    def __missing__(self, key):
+        if key not in self.VIEWS:
+            raise KeyError(key)
+        value = self[key] = getattr(self, 'compute_' + key)()
+        return value
+    
+    def __getattr__(self, name):
+        if name in self.VIEWS:
+            return self[name]
+        raise AttributeError(name)
+    
+    def __contains__(self, key):
+        return key in self.VIEWS or dict.__contains__(self, key)
+    
+    def get(self, key, default=None):
+        if key in self.VIEWS:
+            return self[key]
+        return dict.get(self, key, default)
+    
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+    
+    def reviews_by_length(self, matches, limit):
+        reviews = [review for review in dict.get(self, 'all_reviews') or [] if matches(review.get('rating', 5))]
+        return sorted(reviews, key=lambda x: len(x.get('text', '')), reverse=True)[:limit]
+    
+    def share_of(self, count_key):
+        total = dict.get(self, 'russian_reviews') or 0
+        return round(dict.get(self, count_key, 0) / total * 100, 1) if total else 0
+    
+    def compute_problems(self):
+        return sorted(
+            [(name, data) for name, data in (dict.get(self, 'problem_stats') or {}).items() if data["count"] > 0],
+            key=lambda x: x[1]["percentage"],
+            reverse=True
+        )
+    
+    def compute_best_positive_reviews(self):
+        return self.reviews_by_length(lambda rating: rating >= 5, 3)
+    
+    def compute_worst_negative_reviews(self):
+        return self.reviews_by_length(lambda rating: rating <= 3, 10)  # 10 критических
+    
+    def compute_critical_percentage(self):
+        return self.share_of('critical_reviews_count')
+    
+    def compute_positive_percentage(self):
+        return self.share_of('positive_reviews_count')
+    
+    def compute_top_critical_reviews(self):
+        """🎯 10 самых критических отзывов с кратким описанием проблемы"""
+        all_reviews = dict.get(self, 'all_reviews')
+        if not all_reviews:
+            return []
+        
+        candidate_reviews = dict.get(self, 'critical_candidates')
+        if candidate_reviews is None:
+            # Анализ из старого чекпоинта журнала - баллы считаем тем же движком
+            smart_problems = EsolllReviewEngine.smart_problem_categories(dict.get(self, 'product_name', ''))
+            verdicts = EsolllReviewEngine({}, smart_problems).analyze(all_reviews)
+            candidate_reviews = [verdict.critical for verdict in verdicts if verdict.critical is not None]
+        
+        # Сортируем по критичности
+        top_reviews = sorted(candidate_reviews, key=lambda x: (x['score'], 5 - x['rating'], len(x['text'])), reverse=True)[:10]
+        
+        # Краткое описание проблемы - только для попавших в топ-10
+        return [
+            dict(review, problem_summary=self.problem_summary(review['text'], review['matched_problems']))
+            for review in top_reviews
+        ]
+    
+    @staticmethod
+    def problem_summary(text, matched_problems):
+        """Извлекает краткое описание проблемы"""
+        sentences = text.split('.')
+        problem_sentences = []
+        
+        for sentence in sentences[:3]:  # Первые 3 предложения
+            sentence_clean = sentence.strip()
+            if len(sentence_clean) > 15:
+                for problem in matched_problems:
+                    if any(word in sentence_clean.lower() for word in problem['name'].lower().split()):
+                        problem_sentences.append(sentence_clean)
+                        break
+        
+        if problem_sentences:
+            return problem_sentences[0][:150] + "..." if len(problem_sentences[0]) > 150 else problem_sentences[0]
+        else:
+            return text[:120] + "..." if len(text) > 120 else text
+
 class EsolllAIAnalyzer:
-    def __init__(self, anthropic_api_key):
+    # Расширенный анализ проблем: отзыв относится к первой категории, в которой есть совпадение
+    ENHANCED_PROBLEMS = {
+        "Размеры и габариты": ["размер", "маленький", "большой", "не подошел", "размерная сетка", "велик", "мал", "не тот размер"],
+        "Качество материалов": ["качество", "дешевый", "хрупкий", "некачественный", "плохой", "ужасный", "материал", "пластик"],
+        "Функциональность": ["не работает", "бракованный", "глючит", "сломался", "поломка", "брак", "дефект", "не функционирует"],
+        "Энергопитание": ["батарея", "не заряжается", "разряжается", "быстро садится", "заряд", "зарядка", "питание"],
+        "Сборка и швы": ["швы", "нитки", "расползается", "кривые швы", "обтрепался", "сборка", "развалился"],
+        "Запах и химия": ["запах", "воняет", "химический запах", "пахнет", "вонь", "неприятный запах", "токсичный"],
+        "Логистика": ["доставка", "упаковка", "помят", "поврежден", "курьер", "испорчен", "битый"],
+        "Соответствие описанию": ["обман", "не соответствует", "другой товар", "подделка", "врут", "неправда", "не то"],
+        "Общее разочарование": ["не советую", "ужас", "кошмар", "верните деньги", "жалею", "отвратительно", "разочарован"]
+    }
+    
+    def __init__(self, anthropic_api_key, http=None, language_detector=None, cpu=None):
         self.anthropic_api_key = anthropic_api_key
+        self.http = http or EsolllHTTPClient()
+        self.language_detector = language_detector or EsolllLanguageDetector()
+        self.cpu = cpu or EsolllCPUExecutor('inline')
         self.ai_headers = {
             'Content-Type': 'application/json',
             'x-api-key': anthropic_api_key,
@@ -46,13 +948,14 @@ class EsolllAIAnalyzer:
         try:
             # Подготавливаем данные для ESOLLL AI
             reviews_sample = []
-            for review in reviews[:25]:  # Берем 25 лучших отзывов для AI
-                text = review.get('review_text', review.get('text', ''))
-                rating = review.get('rating', review.get('review_rating', 5))
-                if text and len(text.strip()) > 20:
+            candidates = [review for review in reviews if len(review.get('text', '').strip()) > 20]
+            # 25 отзывов для AI - стратифицированно по оценке и дате, а не первые по порядку MPStats
+            for review in EsolllReviewSampler(25, seed=product_name).extend(candidates).sample():
+                text = review.get('text', '')
+                if text:
                     reviews_sample.append({
                         'text': text[:600],  # Увеличили лимит
-                        'rating': rating,
+                        'rating': review.get('rating', 5),
                         'date': review.get('date', '')
                     })
             
@@ -120,47 +1023,47 @@ class EsolllAIAnalyzer:
 Анализируй на РУССКОМ ЯЗЫКЕ как эксперт ESOLLL AI с максимальной практической пользой!"""
 
             # Отправляем в ESOLLL AI Engine
-            async with aiohttp.ClientSession() as session:
-                ai_url = "https://api.anthropic.com/v1/messages"
-                ai_payload = {
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 4500,
-                    "messages": [
-                        {
-                            "role": "user", 
-                            "content": ai_prompt
-                        }
-                    ]
-                }
-                
-                async with session.post(
-                    ai_url, 
-                    headers=self.ai_headers, 
-                    json=ai_payload,
-                    timeout=aiohttp.ClientTimeout(total=35)
-                ) as response:
-                    if response.status == 200:
-                        ai_response = await response.json()
-                        ai_content = ai_response['content'][0]['text']
+            session = await self.http.get_session()
+            ai_url = "https://api.anthropic.com/v1/messages"
+            ai_payload = {
+                "model": "claude-3-5-sonnet-20241022",
+                "max_tokens": 4500,
+                "messages": [
+                    {
+                        "role": "user", 
+                        "content": ai_prompt
+                    }
+                ]
+            }
+            
+            async with session.post(
+                ai_url, 
+                headers=self.ai_headers, 
+                json=ai_payload,
+                timeout=aiohttp.ClientTimeout(total=35)
+            ) as response:
+                if response.status == 200:
+                    ai_response = await response.json()
+                    ai_content = ai_response['content'][0]['text']
+                    
+                    try:
+                        # Извлекаем JSON из ответа ESOLLL AI
+                        json_start = ai_content.find('{')
+                        json_end = ai_content.rfind('}') + 1
+                        json_str = ai_content[json_start:json_end]
+                        esolll_analysis = json.loads(json_str)
                         
-                        try:
-                            # Извлекаем JSON из ответа ESOLLL AI
-                            json_start = ai_content.find('{')
-                            json_end = ai_content.rfind('}') + 1
-                            json_str = ai_content[json_start:json_end]
-                            esolll_analysis = json.loads(json_str)
-                            
-                            print("✅ ESOLLL AI PROFESSIONAL ANALYSIS COMPLETED!")
-                            return esolll_analysis
-                            
-                        except json.JSONDecodeError as e:
-                            print(f"⚠️ Ошибка парсинга ESOLLL AI: {e}")
-                            print(f"AI ответ: {ai_content[:500]}...")
-                            return self.create_fallback_analysis()
-                    else:
-                        print(f"❌ Ошибка ESOLLL AI Engine: {response.status}")
-                        return self.create_fallback_analysis()
+                        print("✅ ESOLLL AI PROFESSIONAL ANALYSIS COMPLETED!")
+                        return esolll_analysis
                         
+                    except json.JSONDecodeError as e:
+                        print(f"⚠️ Ошибка парсинга ESOLLL AI: {e}")
+                        print(f"AI ответ: {ai_content[:500]}...")
+                        return self.create_fallback_analysis()
+                else:
+                    print(f"❌ Ошибка ESOLLL AI Engine: {response.status}")
+                    return self.create_fallback_analysis()
+                    
         except Exception as e:
             print(f"❌ Ошибка ESOLLL AI Professional Engine: {e}")
             return self.create_fallback_analysis()
@@ -207,7 +1110,8 @@ class EsolllAIAnalyzer:
             }
         }
     
-    def determine_category(self, product_name):
+    @staticmethod
+    def determine_category(product_name):
         text = product_name.lower()
         if any(word in text for word in ["одежда", "футболка", "джинсы", "платье", "брюки"]):
             return "одежда"
@@ -217,54 +1121,45 @@ class EsolllAIAnalyzer:
             return "default"
     
     def filter_russian_reviews(self, reviews):
-        russian_reviews = []
-        for review in reviews:
-            text = review.get('text', review.get('review_text', ''))
-            if not text or len(text.strip()) < 15:
-                continue
-            
-            russian_chars = sum(1 for char in text if 'а' <= char.lower() <= 'я')
-            total_chars = sum(1 for char in text if char.isalpha())
-            
-            if total_chars > 0 and (russian_chars / total_chars) > 0.5:
-                normalized_review = {
-                    'review_text': text,
-                    'text': text,
-                    'rating': review.get('rating', review.get('valuation', 5)),
-                    'review_rating': review.get('rating', review.get('valuation', 5)),
-                    'date': review.get('date', ''),
-                    'answer': review.get('answer', '')
-                }
-                russian_reviews.append(normalized_review)
-        
-        return russian_reviews
+        # Отзывы из чекпоинтов журнала приходят словарями
+        reviews = [EsolllReview.from_dict(review) for review in reviews]
+        accepted = self.language_detector.classify([review.text for review in reviews])
+        return [review for review, is_russian in zip(reviews, accepted) if is_russian]
     
     async def analyze_with_esolll_professional(self, reviews, product_name):
         """🚀 ESOLLL AI PROFESSIONAL COMPREHENSIVE ANALYSIS"""
-        russian_reviews = self.filter_russian_reviews(reviews)
-        if not russian_reviews:
+        # Детерминированная часть - в пуле EsolllCPUExecutor, если текста отзывов много
+        basic_analysis = await self.cpu.run(
+            esolll_basic_analysis_job, reviews, product_name, self.language_detector, size=reviews_text_size(reviews)
+        )
+        if basic_analysis is None:
             return None
         
-        category = self.determine_category(product_name)
+        print("🤖 ЗАПУСК ESOLLL AI PROFESSIONAL ENGINE...")
+        esolll_ai_analysis = await self.analyze_with_esolll_ai(basic_analysis['all_reviews'], product_name, basic_analysis)
         
-        # Расширенный анализ проблем
-        enhanced_problems = {
-            "Размеры и габариты": ["размер", "маленький", "большой", "не подошел", "размерная сетка", "велик", "мал", "не тот размер"],
-            "Качество материалов": ["качество", "дешевый", "хрупкий", "некачественный", "плохой", "ужасный", "материал", "пластик"],
-            "Функциональность": ["не работает", "бракованный", "глючит", "сломался", "поломка", "брак", "дефект", "не функционирует"],
-            "Энергопитание": ["батарея", "не заряжается", "разряжается", "быстро садится", "заряд", "зарядка", "питание"],
-            "Сборка и швы": ["швы", "нитки", "расползается", "кривые швы", "обтрепался", "сборка", "развалился"],
-            "Запах и химия": ["запах", "воняет", "химический запах", "пахнет", "вонь", "неприятный запах", "токсичный"],
-            "Логистика": ["доставка", "упаковка", "помят", "поврежден", "курьер", "испорчен", "битый"],
-            "Соответствие описанию": ["обман", "не соответствует", "другой товар", "подделка", "врут", "неправда", "не то"],
-            "Общее разочарование": ["не советую", "ужас", "кошмар", "верните деньги", "жалею", "отвратительно", "разочарован"]
-        }
+        # Объединяем анализы
+        basic_analysis["esolll_ai_analysis"] = esolll_ai_analysis
+        basic_analysis["ai_powered"] = True
+        
+        return basic_analysis
+    
+    @classmethod
+    def basic_analysis(cls, reviews, product_name, language_detector=None):
+        """Базовый анализ без ИИ: группы по оценке, статистика проблем и кандидаты в топ-10"""
+        enhanced_problems = cls.ENHANCED_PROBLEMS
+        # Язык, группа по оценке, проблема и критичность - за один проход по каждому отзыву
+        engine = EsolllReviewEngine.for_product(enhanced_problems, product_name, language_detector)
+        verdicts = engine.analyze(reviews)
+        if not verdicts:
+            return None
+        russian_reviews = [verdict.review for verdict in verdicts]
+        
+        category = cls.determine_category(product_name)
         
         total_reviews = len(russian_reviews)
         problem_stats = {}
-        critical_reviews = []
-        positive_reviews = []
-        neutral_reviews = []
+        bucket_counts = collections.Counter()
         
         # Инициализируем проблемы
         for problem_name in enhanced_problems:
@@ -275,80 +1170,42 @@ class EsolllAIAnalyzer:
                 "detailed_reviews": []
             }
         
-        for review in russian_reviews:
-            text = review.get('review_text', '').lower()
-            rating = review.get('rating', 5)
-            original_text = review.get('review_text', '')
+        for verdict in verdicts:
+            original_text = verdict.review.text
+            # Сам отзыв вместо копии: short_text считается лениво при обращении
+            review_data = verdict.review
             
-            review_data = {
-                'text': original_text,
-                'rating': rating,
-                'date': review.get('date', ''),
-                'short_text': original_text[:250] + "..." if len(original_text) > 250 else original_text
-            }
+            bucket_counts[verdict.bucket] += 1
             
-            if rating <= 3:
-                critical_reviews.append(review_data)
-            elif rating >= 5:
-                positive_reviews.append(review_data)
-            else:
-                neutral_reviews.append(review_data)
-            
-            # Поиск проблем с весами
-            for problem_name, keywords in enhanced_problems.items():
-                problem_found = False
-                for keyword in keywords:
-                    if keyword in text:
-                        problem_stats[problem_name]["count"] += 1
-                        if len(problem_stats[problem_name]["examples"]) < 2:
-                            example = original_text[:200].strip()
-                            if example:
-                                problem_stats[problem_name]["examples"].append(example + "...")
-                        if len(problem_stats[problem_name]["detailed_reviews"]) < 3:
-                            problem_stats[problem_name]["detailed_reviews"].append(review_data)
-                        problem_found = True
-                        break
-                if problem_found:
-                    break  # Один отзыв = одна проблема
+            problem_name = verdict.problem
+            if problem_name is not None:
+                problem_stats[problem_name]["count"] += 1
+                if len(problem_stats[problem_name]["examples"]) < 2:
+                    example = original_text[:200].strip()
+                    if example:
+                        problem_stats[problem_name]["examples"].append(example + "...")
+                if len(problem_stats[problem_name]["detailed_reviews"]) < 3:
+                    problem_stats[problem_name]["detailed_reviews"].append(review_data)
         
         # Вычисляем проценты
         for problem_name, data in problem_stats.items():
             if data["count"] > 0:
                 data["percentage"] = round((data["count"] / total_reviews) * 100, 1)
         
-        # Сортируем проблемы
-        sorted_problems = sorted(
-            [(name, data) for name, data in problem_stats.items() if data["count"] > 0],
-            key=lambda x: x[1]["percentage"],
-            reverse=True
-        )
-        
-        best_positive = sorted(positive_reviews, key=lambda x: len(x['text']), reverse=True)[:3]
-        worst_negative = sorted(critical_reviews, key=lambda x: len(x['text']), reverse=True)[:10]  # 10 критических
-        
-        # Базовый анализ готов
-        basic_analysis = {
+        # Базовый анализ готов; сортировки, доли и топ-10 считаются при первом обращении
+        return EsolllAnalysisResult({
             "product_name": product_name,
             "category": category,
             "total_reviews": len(reviews),
             "russian_reviews": total_reviews,
-            "critical_reviews_count": len(critical_reviews),
-            "positive_reviews_count": len(positive_reviews),
-            "neutral_reviews_count": len(neutral_reviews),
-            "problems": sorted_problems,
-            "best_positive_reviews": best_positive,
-            "worst_negative_reviews": worst_negative,
-            "all_reviews": russian_reviews
-        }
-        
-        print("🤖 ЗАПУСК ESOLLL AI PROFESSIONAL ENGINE...")
-        esolll_ai_analysis = await self.analyze_with_esolll_ai(russian_reviews, product_name, basic_analysis)
-        
-        # Объединяем анализы
-        basic_analysis["esolll_ai_analysis"] = esolll_ai_analysis
-        basic_analysis["ai_powered"] = True
-        
-        return basic_analysis
+            "critical_reviews_count": bucket_counts['critical'],
+            "positive_reviews_count": bucket_counts['positive'],
+            "neutral_reviews_count": bucket_counts['neutral'],
+            "problem_stats": problem_stats,
+            "all_reviews": russian_reviews,
+            # Кандидаты в топ-10 критических отзывов отчета, уже с баллами
+            "critical_candidates": [verdict.critical for verdict in verdicts if verdict.critical is not None]
+        })
     
     def calculate_risk_with_esolll_ai(self, analysis):
         """Профессиональный расчет рисков с ESOLLL AI"""
@@ -480,74 +1337,184 @@ class EsolllAIAnalyzer:
         }
 
 class EsolllEnhancedParser:
-    def __init__(self, api_key):
+    BASE_URL = "https://mpstats.io/api/wb/get/item"
+    
+    def __init__(self, api_key, http=None, product_cache=None, review_store=None, breaker=None, max_retries=2,
+                 base_url=None, sample_scan=20000, min_review_length=15):
         self.api_key = api_key
+        self.http = http or EsolllHTTPClient()
+        # Другой адрес - например, локальный стенд tools/mpstats_standin.py
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        # Название, бренд, рейтинг и цена меняются медленно - популярные артикулы не запрашиваем повторно
+        self.product_cache = product_cache
+        self.review_store = review_store
+        self.breaker = breaker or EsolllCircuitBreaker('MPStats')
+        self.max_retries = max_retries
+        # Сколько отзывов просматривается для стратифицированной выборки
+        self.sample_scan = sample_scan
+        # Тот же порог, что у EsolllLanguageDetector: короткие отзывы не занимают место в выборке
+        self.min_review_length = min_review_length
+        self.backoff_base = 1
+        self.backoff_max = 8
+        self.max_retry_after = 30
         self.headers = {
             'X-Mpstats-TOKEN': api_key,
             'Content-Type': 'application/json'
         }
     
-    async def get_product_info(self, article_id):
-        async with aiohttp.ClientSession() as session:
+    async def mpstats_request(self, url, read, params=None, timeout=12):
+        """GET к MPStats с повторами и circuit breaker; None - окончательный ответ API"""
+        session = await self.http.get_session()
+        last_error = None
+        
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise EsolllMPStatsUnavailable("MPStats недоступен (circuit breaker открыт)", self.breaker.retry_after())
+            
+            delay = None
             try:
-                url = f"https://mpstats.io/api/wb/get/item/{article_id}"
-                async with session.get(url, headers=self.headers, timeout=aiohttp.ClientTimeout(total=12)) as response:
+                async with session.get(url, headers=self.headers, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
                     if response.status == 200:
-                        data = await response.json()
-                        if 'item' in data and data['item']:
-                            product = data['item']
-                            return {
-                                'id': article_id,
-                                'name': product.get('name', f'Товар WB {article_id}'),
-                                'brand': product.get('brand', ''),
-                                'rating': product.get('rating', 0),
-                                'comments': product.get('comments', 0),
-                                'price': product.get('final_price', product.get('price', 0)),
-                                'found': True
-                            }
-                        else:
-                            return None
+                        result = await read(response)
+                        self.breaker.record_success()
+                        return result
+                    
+                    last_error = f"HTTP {response.status}"
+                    if response.status == 429:
+                        # Лимит запросов: сервис жив, ждем столько, сколько просит MPStats
+                        self.breaker.record_success()
+                        try:
+                            delay = min(self.max_retry_after, float(response.headers.get('Retry-After', '')))
+                        except ValueError:
+                            delay = None
+                    elif response.status >= 500:
+                        self.breaker.record_failure()
                     else:
+                        self.breaker.record_success()
                         return None
-            except Exception as e:
-                print(f"❌ Ошибка получения товара: {e}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.breaker.record_failure()
+                last_error = repr(e)
+            
+            if attempt < self.max_retries:
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"⚠️ MPStats: {last_error}, повтор {attempt + 1}/{self.max_retries} через {delay:.1f} сек")
+                await asyncio.sleep(delay)
+        
+        raise EsolllMPStatsUnavailable(
+            f"MPStats не ответил после {self.max_retries + 1} попыток: {last_error}", self.breaker.retry_after()
+        )
+    
+    async def get_product_info(self, article_id):
+        if self.product_cache is None:
+            return await self.fetch_product_info(article_id)
+        product = await self.product_cache.get_or_load(article_id, self.fetch_product_info)
+        # Копия: вызывающий код не должен менять запись в кэше
+        return dict(product) if product is not None else None
+    
+    async def fetch_product_info(self, article_id):
+        async def read_product(response):
+            data = await response.json()
+            if 'item' in data and data['item']:
+                product = data['item']
+                return {
+                    'id': article_id,
+                    'name': product.get('name', f'Товар WB {article_id}'),
+                    'brand': product.get('brand', ''),
+                    'rating': product.get('rating', 0),
+                    'comments': product.get('comments', 0),
+                    'price': product.get('final_price', product.get('price', 0)),
+                    'found': True
+                }
+            else:
                 return None
+        
+        try:
+            url = f"{self.base_url}/{article_id}"
+            return await self.mpstats_request(url, read_product, timeout=12)
+        except EsolllMPStatsUnavailable:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка получения товара: {e}")
+            return None
     
     async def get_extended_reviews(self, article_id, target_reviews=120):
-        url = f"https://mpstats.io/api/wb/get/item/{article_id}/comments"
+        if self.review_store is not None:
+            return await self.get_stored_reviews(article_id, target_reviews)
+        
+        sampler = EsolllReviewSampler(target_reviews, seed=article_id)
+        comments = await self.fetch_comments(article_id, limit=self.sample_scan, sampler=sampler)
+        if not comments:
+            return None
         
-        async with aiohttp.ClientSession() as session:
+        return [EsolllReview.from_comment(comment) for comment in comments]
+    
+    async def get_stored_reviews(self, article_id, target_reviews=120):
+        """Отзывы из локального хранилища; из MPStats догружаются только новее отметки даты"""
+        # Запись и чтение SQLite - в потоке: первая синхронизация пишет всю историю артикула
+        high_water, _ = await asyncio.to_thread(self.review_store.sync_state, article_id)
+        
+        if await asyncio.to_thread(self.review_store.needs_sync, article_id):
             try:
-                async with session.get(url, headers=self.headers, timeout=aiohttp.ClientTimeout(total=25)) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if isinstance(data, dict) and 'comments' in data:
-                            comments = data['comments']
-                            if comments and len(comments) > 0:
-                                selected_comments = comments[:target_reviews]
-                                normalized_reviews = []
-                                for comment in selected_comments:
-                                    if comment.get('text') and len(comment.get('text', '').strip()) >= 15:
-                                        normalized_review = {
-                                            'text': comment.get('text', ''),
-                                            'review_text': comment.get('text', ''),
-                                            'rating': comment.get('valuation', 5),
-                                            'review_rating': comment.get('valuation', 5),
-                                            'valuation': comment.get('valuation', 5),
-                                            'date': comment.get('date', ''),
-                                            'answer': comment.get('answer', '')
-                                        }
-                                        normalized_reviews.append(normalized_review)
-                                return normalized_reviews
-                            else:
-                                return None
-                        else:
-                            return None
-                    else:
-                        return None
-            except Exception as e:
-                print(f"❌ Ошибка загрузки отзывов: {e}")
+                # Синхронизация читает ответ целиком, без ранней остановки: иначе отметка high_water
+                # сдвинулась бы за недочитанные отзывы и они бы никогда не попали в хранилище
+                comments = await self.fetch_comments(article_id, since=high_water)
+            except EsolllMPStatsUnavailable:
+                if high_water is None:
+                    raise
+                comments = None
+            if comments is not None:
+                if high_water:
+                    # d1 фильтрует по дню - отзывы старше отметки отбрасываем сами
+                    comments = [c for c in comments if (c.get('date') or '') >= high_water]
+                added = await asyncio.to_thread(self.review_store.add_comments, article_id, comments, high_water)
+                print(f"🗄️ Отзывы {article_id}: {'дозагружено' if high_water else 'загружено'} {added} новых")
+            elif high_water is None:
+                return None
+            else:
+                print(f"⚠️ MPStats недоступен, использую сохраненные отзывы {article_id}")
+        
+        sampler = EsolllReviewSampler(target_reviews, seed=article_id)
+        return await asyncio.to_thread(self.review_store.sample_reviews, article_id, sampler, self.sample_scan) or None
+    
+    async def fetch_comments(self, article_id, since=None, limit=None, sampler=None):
+        """Сырые отзывы MPStats (since - только начиная с этой даты) или None при ошибке"""
+        url = f"{self.base_url}/{article_id}/comments"
+        params = {'d1': since[:10]} if since else None
+        
+        async def read_comments(response):
+            stream = EsolllCommentsStream()
+            comments = []
+            usable = 0
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                for comment in stream.feed(chunk):
+                    if not isinstance(comment, dict):
+                        continue
+                    if sampler is None:
+                        comments.append(comment)
+                        usable += is_usable_comment(comment, self.min_review_length)
+                    elif is_usable_comment(comment, self.min_review_length):
+                        sampler.add(comment)
+                        usable += 1
+                if stream.done or (limit is not None and usable >= limit):
+                    break
+            else:
+                stream.close()
+            if not stream.done:
+                # Ранняя остановка: недочитанный ответ нельзя вернуть в пул keep-alive
+                response.close()
+            if not stream.found:
                 return None
+            return comments if sampler is None else sampler.sample()
+        
+        try:
+            return await self.mpstats_request(url, read_comments, params=params, timeout=25)
+        except EsolllMPStatsUnavailable:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка загрузки отзывов: {e}")
+            return None
 
 class EsolllAIReporter:
     def __init__(self):
@@ -555,142 +1522,16 @@ class EsolllAIReporter:
     
     def select_top_10_critical_reviews(self, analysis):
         """🎯 ОТБОР 10 САМЫХ КРИТИЧЕСКИХ ОТЗЫВОВ"""
-        if not analysis.get('all_reviews'):
-            return []
-        
-        product_name = analysis.get('product_name', '')
-        
-        # Умные проблемы в зависимости от товара
-        smart_problems = self.get_smart_problem_categories(product_name)
-        
-        # Собираем все ключевые слова
-        all_keywords = []
-        for keywords_list in smart_problems.values():
-            all_keywords.extend(keywords_list)
-        
-        # Негативные индикаторы
-        negative_indicators = ['плохо', 'ужасно', 'отвратительно', 'разочарован', 'жалею', 'верните', 
-                              'не рекомендую', 'не советую', 'бред', 'фигня', 'отстой', 'развод',
-                              'кошмар', 'ужас', 'деньги на ветер', 'обман', 'подделка']
-        
-        candidate_reviews = []
-        
-        # Анализируем каждый отзыв
-        for review in analysis['all_reviews']:
-            rating = review.get('rating', 5)
-            text = review.get('text', '')
-            text_lower = text.lower()
-            
-            # Исключаем хорошие отзывы и слишком короткие
-            if rating >= 5 or len(text.strip()) < 30:
-                continue
-            
-            review_score = 0
-            matched_problems = []
-            
-            # Поиск проблем по категориям
-            for problem_category, keywords in smart_problems.items():
-                matches = sum(1 for keyword in keywords if keyword in text_lower)
-                if matches > 0:
-                    matched_problems.append({
-                        'name': problem_category,
-                        'severity': 'высокая' if matches >= 2 else 'средняя',
-                        'matches': matches
-                    })
-                    review_score += matches * 6  # Высокий вес за совпадения
-            
-            # Поиск негативных индикаторов
-            negative_count = sum(1 for indicator in negative_indicators if indicator in text_lower)
-            review_score += negative_count * 4
-            
-            # Бонусы за рейтинг
-            if rating <= 2:
-                review_score += 20
-            elif rating == 3:
-                review_score += 15
-            elif rating == 4:
-                review_score += 8
-            
-            # Бонус за длину (больше деталей)
-            if len(text) > 100:
-                review_score += 5
-            if len(text) > 200:
-                review_score += 5
-            
-            # Минимальный порог для попадания
-            if review_score >= 8:
-                if not matched_problems:
-                    matched_problems = [{'name': 'Общее недовольство', 'severity': 'средняя', 'matches': 1}]
-                
-                candidate_reviews.append({
-                    'text': text,
-                    'rating': rating,
-                    'date': review.get('date', ''),
-                    'score': review_score,
-                    'matched_problems': matched_problems,
-                    'problem_summary': self.extract_problem_summary(text, matched_problems)
-                })
-        
-        # Сортируем по критичности
-        candidate_reviews.sort(key=lambda x: (x['score'], 5 - x['rating'], len(x['text'])), reverse=True)
-        
-        # Возвращаем топ-10
-        return candidate_reviews[:10]
+        # Считается один раз на анализ: отчет, секция отчета и бот читают готовый список
+        return EsolllAnalysisResult.wrap(analysis).top_critical_reviews
     
     def get_smart_problem_categories(self, product_name):
         """Умная категоризация проблем в зависимости от товара"""
-        product_lower = product_name.lower()
-        
-        if any(word in product_lower for word in ["сушилка", "центрифуга", "салат"]):
-            return {
-                "Проблемы сушки": ["не сушит", "плохо сушит", "мокрый", "влажный", "не высыхает"],
-                "Механизм вращения": ["не крутится", "слабо крутится", "заедает", "тормозит", "медленно"],
-                "Размер корзины": ["маленькая", "большая", "не помещается", "мало места"],
-                "Качество сборки": ["разваливается", "хлипкий", "неустойчивый", "шатается"],
-                "Материалы": ["пластик", "тонкий", "хрупкий", "некачественный материал"]
-            }
-        elif any(word in product_lower for word in ["наушники", "bluetooth", "tws"]):
-            return {
-                "Качество звука": ["тихий", "искажения", "басы", "звук плохой", "шипит"],
-                "Bluetooth связь": ["не подключается", "отключается", "теряет связь", "bluetooth"],
-                "Время работы": ["быстро разряжается", "не заряжается", "держит заряд", "батарея"],
-                "Комфорт": ["выпадают", "неудобные", "давят", "болят уши"],
-                "Микрофон": ["не слышно", "микрофон", "плохо слышат", "эхо"]
-            }
-        elif any(word in product_lower for word in ["зарядка", "кабель", "провод"]):
-            return {
-                "Скорость зарядки": ["медленно заряжает", "долго заряжается", "слабая зарядка"],
-                "Надежность": ["ломается", "отходит", "не заряжает", "перестал работать"],
-                "Размеры": ["короткий", "длинный", "не хватает длины"],
-                "Совместимость": ["не подходит", "не совместим", "не работает с"],
-                "Качество": ["тонкий", "дешевый", "рвется", "гнется"]
-            }
-        else:
-            return {
-                "Функциональность": ["не работает", "бракованный", "глючит", "сломался"],
-                "Качество": ["дешевый", "хрупкий", "некачественный", "плохой"],
-                "Размеры": ["размер", "маленький", "большой", "не подходит"],
-                "Сборка": ["разваливается", "неустойчивый", "хлипкий", "плохая сборка"],
-                "Материалы": ["материал", "пластик", "металл", "ткань"]
-            }
+        return EsolllReviewEngine.smart_problem_categories(product_name)
     
     def extract_problem_summary(self, text, matched_problems):
         """Извлекает краткое описание проблемы"""
-        sentences = text.split('.')
-        problem_sentences = []
-        
-        for sentence in sentences[:3]:  # Первые 3 предложения
-            sentence_clean = sentence.strip()
-            if len(sentence_clean) > 15:
-                for problem in matched_problems:
-                    if any(word in sentence_clean.lower() for word in problem['name'].lower().split()):
-                        problem_sentences.append(sentence_clean)
-                        break
-        
-        if problem_sentences:
-            return problem_sentences[0][:150] + "..." if len(problem_sentences[0]) > 150 else problem_sentences[0]
-        else:
-            return text[:120] + "..." if len(text) > 120 else text
+        return EsolllAnalysisResult.problem_summary(text, matched_problems)
     
     def create_critical_reviews_section(self, analysis):
         """📝 СЕКЦИЯ 10 КРИТИЧЕСКИХ ОТЗЫВОВ"""
@@ -999,32 +1840,10 @@ class EsolllAIReporter:
     </style>
 </head>
 <body>
-    <div class="container">
-        {self.create_professional_header(article_id)}
-        
-        <div class="product-section">
-            <div class="product-card">
-                <div class="product-name">📦 {product_data['name']}</div>
-                <div class="product-details">
-                    <div class="detail-item">
-                        <div class="detail-value">{product_data['brand']}</div>
-                        <div class="detail-label">Бренд</div>
-                    </div>
-                    <div class="detail-item">
-                        <div class="detail-value">⭐ {product_data['rating']}/5</div>
-                        <div class="detail-label">Рейтинг</div>
-                    </div>
-                    <div class="detail-item">
-                        <div class="detail-value">{product_data['comments']}</div>
-                        <div class="detail-label">Отзывов</div>
-                    </div>
-                    <div class="detail-item">
-                        <div class="detail-value">{product_data['price']} ₽</div>
-                        <div class="detail-label">Цена</div>
-                    </div>
-                </div>
-            </div>
-        </div>
+    <div class="container">
+        {self.create_professional_header(article_id)}
+        
+        {self.create_product_section(product_data)}
         
         {self.create_professional_decision_box(risk_data)}
         
@@ -1108,6 +1927,110 @@ class EsolllAIReporter:
             print(f"❌ ОШИБКА ГЕНЕРАЦИИ ESOLLL AI ОТЧЕТА: {e}")
             return self.generate_error_report(article_id)
     
+    def create_product_section(self, product_data, anchor=None):
+        anchor_attr = f' id="{anchor}"' if anchor else ''
+        return f"""
+        <div class="product-section"{anchor_attr}>
+            <div class="product-card">
+                <div class="product-name">📦 {product_data['name']}</div>
+                <div class="product-details">
+                    <div class="detail-item">
+                        <div class="detail-value">{product_data['brand']}</div>
+                        <div class="detail-label">Бренд</div>
+                    </div>
+                    <div class="detail-item">
+                        <div class="detail-value">⭐ {product_data['rating']}/5</div>
+                        <div class="detail-label">Рейтинг</div>
+                    </div>
+                    <div class="detail-item">
+                        <div class="detail-value">{product_data['comments']}</div>
+                        <div class="detail-label">Отзывов</div>
+                    </div>
+                    <div class="detail-item">
+                        <div class="detail-value">{product_data['price']} ₽</div>
+                        <div class="detail-label">Цена</div>
+                    </div>
+                </div>
+            </div>
+        </div>
+        """
+    
+    def generate_batch_report(self, items):
+        """📦 Сводный ESOLLL AI отчет по пакету артикулов: таблица и разделы по каждому товару"""
+        rows = []
+        sections = []
+        for index, item in enumerate(items, 1):
+            article_id = item['article_id']
+            if item['status'] != 'ok':
+                rows.append(f"""
+                <tr class="batch-row-failed">
+                    <td>{index}</td><td>{article_id}</td>
+                    <td colspan="4">{BATCH_STATUS_LABELS.get(item['status'], BATCH_STATUS_LABELS['error'])}</td>
+                </tr>""")
+                continue
+            
+            product_data = item['product_data']
+            risk_data = item['risk_data']
+            analysis = item['analysis']
+            ai_rating = f"{risk_data.get('esolll_ai_rating', 'N/A')}/10" if risk_data.get('esolll_ai_influence') else '—'
+            rows.append(f"""
+                <tr>
+                    <td>{index}</td>
+                    <td><a href="#item-{article_id}">{article_id}</a></td>
+                    <td>{product_data['name'][:60]}<br><small>{product_data['brand']}</small></td>
+                    <td>⭐ {product_data['rating']}/5</td>
+                    <td>{ai_rating}</td>
+                    <td>{risk_data['decision_emoji']} {risk_data['decision']}</td>
+                </tr>""")
+            
+            try:
+                sections.append(f"""
+        {self.create_product_section(product_data, anchor=f'item-{article_id}')}
+        
+        {self.create_professional_decision_box(risk_data)}
+        
+        {self.create_critical_reviews_section(analysis)}
+        
+        {self.create_esolll_ai_insights_section(analysis.get("esolll_ai_analysis", {}))}""")
+            except Exception as e:
+                print(f"❌ ОШИБКА РАЗДЕЛА ПАКЕТНОГО ОТЧЕТА {article_id}: {e}")
+        
+        rows_html = ''.join(rows)
+        sections_html = ''.join(sections)
+        return f"""
+<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>ESOLLL AI Professional Batch Report - {len(items)} товаров</title>
+    <style>
+        {self.get_esolll_professional_styles()}
+    </style>
+</head>
+<body>
+    <div class="container">
+        {self.create_professional_header(f"пакет из {len(items)} товаров")}
+        
+        <div class="batch-summary-section">
+            <h2>📦 Сводная таблица ESOLLL AI</h2>
+            <table class="batch-table">
+                <thead>
+                    <tr><th>#</th><th>Артикул</th><th>Товар</th><th>Рейтинг</th><th>ESOLLL AI</th><th>Решение</th></tr>
+                </thead>
+                <tbody>{rows_html}
+                </tbody>
+            </table>
+        </div>
+        
+        {sections_html}
+        
+        {self.create_professional_footer()}
+    </div>
+</body>
+</html>
+        """
+    
     def create_professional_header(self, article_id):
         return f"""
         <div class="professional-header">
@@ -1373,6 +2296,40 @@ class EsolllAIReporter:
             border: 3px solid #ffc107;
         }
         
+        /* ПАКЕТНЫЙ ОТЧЕТ */
+        .batch-summary-section {
+            padding: 40px;
+            overflow-x: auto;
+        }
+        
+        .batch-summary-section h2 {
+            color: #667eea;
+            font-size: 28px;
+            margin-bottom: 20px;
+            text-align: center;
+            font-weight: 700;
+        }
+        
+        .batch-table {
+            width: 100%;
+            border-collapse: collapse;
+            font-size: 15px;
+        }
+        
+        .batch-table th, .batch-table td {
+            padding: 12px;
+            border-bottom: 1px solid #e9ecef;
+            text-align: left;
+        }
+        
+        .batch-table th {
+            background: #f8f9fa;
+            color: #333;
+        }
+        
+        .batch-table a { color: #667eea; font-weight: 700; }
+        .batch-row-failed td { color: #999; }
+        
         /* КРИТИЧЕСКИЕ ОТЗЫВЫ */
         .critical-reviews-section {
             padding: 40px;
@@ -2009,81 +2966,1311 @@ class EsolllAIReporter:
             .critical-review-card { page-break-inside: avoid; }
             .ai-card { page-break-inside: avoid; }
         }
-        """
+        """
+    
+    def create_professional_footer(self):
+        return f"""
+        <div class="professional-footer">
+            <div class="footer-content">
+                <div class="footer-section">
+                    <strong>🤖 ESOLLL AI Professional Analytics Engine</strong><br>
+                    Революционная система анализа товаров с искусственным интеллектом
+                </div>
+                <div class="footer-section">
+                    <strong>🆕 Professional возможности:</strong><br>
+                    Семантический анализ • Эмоциональная аналитика • AI-прогнозы • 10 критических отзывов
+                </div>
+                <div class="footer-section">
+                    <strong>👨‍💻 Разработчик: Almas Kasymzhanov</strong><br>
+                    📅 ESOLLL AI Professional от {datetime.now().strftime('%d.%m.%Y')}
+                </div>
+            </div>
+            <div class="footer-note">
+                🧠 Анализ выполнен с использованием передовых алгоритмов машинного обучения и семантического анализа
+            </div>
+        </div>
+        """
+    
+    def generate_error_report(self, article_id):
+        return f"""
+<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><title>ESOLLL AI Professional Error</title></head>
+<body style="text-align: center; padding: 50px; font-family: Arial;">
+<h1>🤖 ESOLLL AI Professional Analytics Engine</h1>
+<h2>⚠️ Недостаточно данных</h2>
+<p>Товар {article_id} - недостаточно данных для профессионального анализа</p>
+</body></html>
+        """
+
+def reviews_text_size(reviews):
+    """Размер работы для EsolllCPUExecutor: суммарная длина текстов отзывов в символах"""
+    return sum(len(review.get('text') or '') for review in reviews)
+
+def esolll_basic_analysis_job(reviews, product_name, language_detector):
+    """Задача EsolllCPUExecutor: базовый анализ отзывов (аргументы и результат picklable)"""
+    analysis = EsolllAIAnalyzer.basic_analysis(reviews, product_name, language_detector)
+    if analysis is not None:
+        # Проблемы и топ-10 нужны всегда - считаем их здесь, а не в event loop при первом обращении
+        for view in ('problems', 'top_critical_reviews'):
+            analysis[view]
+    return analysis
+
+def esolll_report_job(reporter, analysis, risk_data, article_id, product_data):
+    """Задача EsolllCPUExecutor: HTML отчет по артикулу, возвращает путь к файлу"""
+    reports_dir = f"esolll_ai_professional_reports_{article_id}"
+    os.makedirs(reports_dir, exist_ok=True)
+    
+    print(f"🤖 Создаю ESOLLL AI Professional отчет для {article_id}...")
+    
+    # Генерируем отчет с ESOLLL AI
+    html_content = reporter.generate_esolll_ai_report(analysis, risk_data, article_id, product_data)
+    
+    report_path = os.path.join(reports_dir, f"esolll_ai_professional_report_{article_id}.html")
+    
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    
+    return report_path
+
+def esolll_batch_report_job(reporter, items, batch_id):
+    """Задача EsolllCPUExecutor: сводный HTML отчет пакета, возвращает путь к файлу"""
+    reports_dir = "esolll_ai_batch_reports"
+    os.makedirs(reports_dir, exist_ok=True)
+    
+    print(f"📦 Создаю сводный ESOLLL AI отчет по {len(items)} артикулам...")
+    
+    html_content = reporter.generate_batch_report(items)
+    report_path = os.path.join(reports_dir, f"esolll_ai_batch_report_{batch_id}.html")
+    
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    
+    return report_path
+
+class EsolllCPUExecutor:
+    """🧮 Синхронная CPU-работа анализа вне event loop: process, thread или inline"""
+    MODES = ('process', 'thread', 'inline')
+    
+    def __init__(self, mode='thread', workers=2, inline_threshold=4000):
+        if mode not in self.MODES:
+            raise ValueError(f"неизвестный режим EsolllCPUExecutor: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.inline_threshold = inline_threshold
+        self.pool = None
+        self.inline_runs = 0
+        self.offloaded_runs = 0
+    
+    def start(self):
+        if self.pool is None:
+            if self.mode == 'process':
+                self.pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='esolll-cpu')
+        return self.pool
+    
+    async def run(self, func, *args, size=None):
+        """func(*args) в пуле или на месте; func должна быть функцией уровня модуля"""
+        if self.mode == 'inline' or (size is not None and size < self.inline_threshold):
+            self.inline_runs += 1
+            return func(*args)
+        
+        self.offloaded_runs += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.start(), func, *args)
+        except concurrent.futures.process.BrokenProcessPool:
+            # Упавший процесс ломает весь пул - следующая задача получит новый
+            print("⚠️ Пул процессов ESOLLL AI сломан, пересоздаю")
+            self.pool = None
+            raise
+    
+    def stats(self):
+        return {'mode': self.mode, 'inline': self.inline_runs, 'offloaded': self.offloaded_runs}
+    
+    async def shutdown(self):
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            await asyncio.to_thread(pool.shutdown, True)
+
+class EsolllAnalysisPipeline:
+    """🚀 Вычислительная часть анализа артикула без Telegram: product -> reviews -> analysis -> report"""
+    def __init__(self, parser, analyzer, reporter, cpu=None):
+        self.parser = parser
+        self.analyzer = analyzer
+        self.reporter = reporter
+        self.cpu = cpu or analyzer.cpu
+    
+    async def run(self, article_id, checkpoints=None, on_stage=None):
+        checkpoints = checkpoints or {}
+        
+        async def emit(stage, data):
+            if on_stage is not None:
+                await on_stage(stage, data)
+        
+        try:
+            product_data = checkpoints.get('product')
+            if product_data is None:
+                product_data = await self.parser.get_product_info(article_id)
+                if not product_data:
+                    return {'status': 'not_found'}
+            await emit('product', product_data)
+            
+            reviews = checkpoints.get('reviews')
+            if reviews is None:
+                reviews = await self.parser.get_extended_reviews(article_id, target_reviews=120)
+                if not reviews:
+                    return {'status': 'no_reviews'}
+            await emit('reviews', reviews)
+        except EsolllMPStatsUnavailable as e:
+            print(f"⚠️ Анализ {article_id} остановлен: {e}")
+            return {'status': 'mpstats_unavailable', 'retry_after': e.retry_after}
+        
+        saved_analysis = checkpoints.get('analysis')
+        if saved_analysis is None:
+            # ГЛАВНОЕ: запускаем ESOLLL AI Professional анализ
+            analysis = await self.analyzer.analyze_with_esolll_professional(reviews, product_data['name'])
+            if not analysis:
+                return {'status': 'no_data'}
+            risk_data = self.analyzer.calculate_risk_with_esolll_ai(analysis)
+        else:
+            analysis = EsolllAnalysisResult.wrap(saved_analysis['analysis'])
+            risk_data = saved_analysis['risk_data']
+        await emit('analysis', {'analysis': analysis, 'risk_data': risk_data})
+        
+        report_path = checkpoints.get('report')
+        if not report_path or not os.path.exists(report_path):
+            try:
+                report_path = await self.render_report(analysis, risk_data, article_id, product_data)
+            except Exception as e:
+                # Сбой отчета не отменяет готовый анализ: результаты уйдут подписчикам,
+                # а create_professional_report попробует еще раз и сообщит об ошибке отчета
+                print(f"❌ Ошибка создания ESOLLL AI отчета {article_id}: {e}")
+                report_path = None
+        if report_path is not None:
+            await emit('report', report_path)
+        
+        return {
+            'status': 'ok',
+            'product_data': product_data,
+            'analysis': analysis,
+            'risk_data': risk_data,
+            'report_path': report_path
+        }
+    
+    async def render_report(self, analysis, risk_data, article_id, product_data):
+        return await self.cpu.run(esolll_report_job, self.reporter, analysis, risk_data, article_id, product_data)
+    
+    async def render_batch_report(self, items, batch_id):
+        return await self.cpu.run(esolll_batch_report_job, self.reporter, items, batch_id)
+
+def esolll_worker_process_main(worker_id, settings, job_queue, event_queue):
+    """Точка входа процесса-воркера: свой event loop, своя HTTP-сессия и свой пайплайн"""
+    try:
+        asyncio.run(esolll_worker_process_loop(worker_id, settings, job_queue, event_queue))
+    except KeyboardInterrupt:
+        pass
+
+async def esolll_worker_process_loop(worker_id, settings, job_queue, event_queue):
+    http = EsolllHTTPClient()
+    product_cache = EsolllTTLCache(**settings['product_cache'])
+    min_review_length = settings['language'].get('min_length', 15)
+    review_store = EsolllReviewStore(
+        settings['review_store_path'], min_review_length=min_review_length
+    ) if settings['review_store_path'] else None
+    parser = EsolllEnhancedParser(
+        settings['mpstats_api_key'], http=http, product_cache=product_cache, review_store=review_store,
+        breaker=EsolllCircuitBreaker('MPStats', **settings['mpstats_breaker']), max_retries=settings['mpstats_retries'],
+        base_url=settings['mpstats_base_url'], sample_scan=settings['review_sample_scan'],
+        min_review_length=min_review_length
+    )
+    cpu_settings = dict(settings['cpu_executor'])
+    if cpu_settings.get('mode') == 'process':
+        # Процесс-воркер сам отдельный процесс, а daemon-процессам нельзя заводить дочерние
+        cpu_settings['mode'] = 'thread'
+    cpu = EsolllCPUExecutor(**cpu_settings)
+    analyzer = EsolllAIAnalyzer(
+        settings['anthropic_api_key'], http=http, language_detector=EsolllLanguageDetector(**settings['language']), cpu=cpu
+    )
+    pipeline = EsolllAnalysisPipeline(parser, analyzer, EsolllAIReporter())
+    slots = asyncio.Semaphore(settings['concurrency'])
+    tasks = set()
+    
+    async def run_job(job_key, article_id, checkpoints):
+        async def on_stage(stage, data):
+            event_queue.put(('stage', job_key, stage, data))
+        
+        try:
+            result = await pipeline.run(article_id, checkpoints, on_stage)
+            event_queue.put(('result', job_key, result))
+        except Exception as e:
+            event_queue.put(('error', job_key, f"{type(e).__name__}: {e}"))
+        finally:
+            slots.release()
+            event_queue.put(('stats', worker_id, {
+                'product_cache': product_cache.stats(),
+                'mpstats_breaker': parser.breaker.state()
+            }))
+    
+    print(f"⚙️ Процесс-воркер ESOLLL AI #{worker_id} запущен (pid {os.getpid()})")
+    while True:
+        # Главный процесс не присылает больше concurrency задач сразу; слот - страховка
+        await slots.acquire()
+        job = await asyncio.to_thread(job_queue.get)
+        if job is None:
+            slots.release()
+            break
+        task = asyncio.create_task(run_job(*job))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await cpu.shutdown()
+    await http.close()
+    if review_store is not None:
+        review_store.close()
+
+class EsolllProcessWorkers:
+    """⚙️ Пул процессов-воркеров: анализы идут на всех ядрах, Telegram остается в главном процессе"""
+    def __init__(self, mpstats_api_key, anthropic_api_key, processes=2, concurrency=4, product_cache=None,
+                 review_store_path=None, mpstats_breaker=None, mpstats_retries=2, mpstats_base_url=None,
+                 review_sample_scan=20000, language=None, cpu_executor=None):
+        self.settings = {
+            'mpstats_api_key': mpstats_api_key,
+            'anthropic_api_key': anthropic_api_key,
+            'concurrency': concurrency,
+            'product_cache': product_cache or {},
+            'review_store_path': review_store_path,
+            'mpstats_breaker': mpstats_breaker or {},
+            'mpstats_retries': mpstats_retries,
+            'mpstats_base_url': mpstats_base_url,
+            'review_sample_scan': review_sample_scan,
+            'language': language or {},
+            'cpu_executor': cpu_executor or {}
+        }
+        self.processes_count = processes
+        self.concurrency = concurrency
+        self.context = multiprocessing.get_context('spawn')
+        self.job_queues = {}
+        self.event_queue = None
+        self.processes = {}
+        self.jobs = {}
+        self.pending = collections.deque()
+        self.job_keys = itertools.count(1)
+        self.reader_task = None
+        self.worker_stats = {}
+    
+    def start(self):
+        if self.reader_task is not None:
+            return
+        self.event_queue = self.context.Queue()
+        for worker_id in range(1, self.processes_count + 1):
+            self.start_process(worker_id)
+        self.reader_task = asyncio.create_task(self.read_events())
+        print(f"⚙️ Запущено процессов-воркеров ESOLLL AI: {self.processes_count}")
+    
+    def start_process(self, worker_id):
+        # Новая очередь на каждый запуск: упавший процесс мог оставить блокировку старой захваченной
+        self.job_queues[worker_id] = self.context.Queue()
+        process = self.context.Process(
+            target=esolll_worker_process_main,
+            args=(worker_id, self.settings, self.job_queues[worker_id], self.event_queue),
+            name=f"esolll-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self.processes[worker_id] = process
+    
+    async def run(self, article_id, checkpoints=None, on_stage=None):
+        """Выполняет EsolllAnalysisPipeline.run в одном из процессов-воркеров"""
+        self.start()
+        job_key = next(self.job_keys)
+        job = {
+            'future': asyncio.get_running_loop().create_future(),
+            'on_stage': on_stage,
+            'stages': None,
+            'worker_id': None,
+            'payload': (job_key, article_id, checkpoints or {})
+        }
+        self.jobs[job_key] = job
+        self.pending.append(job_key)
+        self.dispatch()
+        try:
+            return await job['future']
+        finally:
+            self.jobs.pop(job_key, None)
+            self.dispatch()
+    
+    def worker_load(self, worker_id):
+        return sum(1 for job in self.jobs.values() if job['worker_id'] == worker_id and not job['future'].done())
+    
+    def dispatch(self):
+        """Отдает ожидающие задачи наименее загруженным процессам со свободными слотами"""
+        while self.pending and self.processes:
+            job = self.jobs.get(self.pending[0])
+            if job is None or job['future'].done():
+                self.pending.popleft()
+                continue
+            worker_id = min(self.processes, key=self.worker_load)
+            if self.worker_load(worker_id) >= self.concurrency:
+                return
+            self.pending.popleft()
+            job['worker_id'] = worker_id
+            self.job_queues[worker_id].put(job['payload'])
+    
+    def next_event(self):
+        try:
+            return self.event_queue.get(timeout=1)
+        except queue.Empty:
+            return None
+    
+    async def read_events(self):
+        last_check = time.monotonic()
+        while True:
+            event = await asyncio.to_thread(self.next_event)
+            # Живость процессов проверяется по таймеру: под постоянным потоком событий очередь не пустеет
+            if event is None or time.monotonic() - last_check >= 1:
+                last_check = time.monotonic()
+                self.check_processes()
+            if event is None:
+                continue
+            if event[0] == 'shutdown':
+                break
+            if event[0] == 'stats':
+                self.worker_stats[event[1]] = event[2]
+                continue
+            
+            kind, job_key = event[0], event[1]
+            job = self.jobs.get(job_key)
+            if job is None or job['future'].done():
+                continue
+            
+            if kind == 'stage':
+                if job['on_stage'] is not None:
+                    job['stages'] = asyncio.create_task(self.run_stage(job, job['stages'], event[2], event[3]))
+            elif kind in ('result', 'error'):
+                # Процесс свободен сразу, а future - после этапов задачи, чтобы их порядок сохранился
+                job['worker_id'] = None
+                self.dispatch()
+                self.finish_after_stages(job, kind, event[2])
+    
+    async def run_stage(self, job, previous, stage, data):
+        """Этапы задачи по очереди, но вне read_events: медленный чат не держит события других задач"""
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await job['on_stage'](stage, data)
+        except Exception as e:
+            print(f"❌ Ошибка обработки этапа {stage}: {e}")
+    
+    def finish_after_stages(self, job, kind, value):
+        def finish(_=None):
+            if job['future'].done():
+                return
+            if kind == 'result':
+                job['future'].set_result(value)
+            else:
+                job['future'].set_exception(RuntimeError(value))
+        
+        if job['stages'] is None or job['stages'].done():
+            finish()
+        else:
+            job['stages'].add_done_callback(finish)
+    
+    def check_processes(self):
+        """Перезапускает упавшие процессы; их задачи завершаются ошибкой, а не висят вечно"""
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            print(f"⚠️ Процесс-воркер ESOLLL AI #{worker_id} завершился (код {process.exitcode}), перезапускаю")
+            # Все задачи, отданные процессу, - и начатые, и еще лежавшие в его очереди
+            for job in self.jobs.values():
+                if job['worker_id'] == worker_id and not job['future'].done():
+                    job['future'].set_exception(RuntimeError(f"процесс-воркер #{worker_id} завершился"))
+            self.start_process(worker_id)
+        self.dispatch()
+    
+    async def stop(self):
+        if self.reader_task is None:
+            return
+        for worker_id in self.processes:
+            self.job_queues[worker_id].put(None)
+        for process in self.processes.values():
+            await asyncio.to_thread(process.join, 30)
+            if process.is_alive():
+                process.terminate()
+        self.processes = {}
+        self.event_queue.put(('shutdown',))
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+        self.reader_task = None
+        for job in self.jobs.values():
+            if not job['future'].done():
+                job['future'].set_exception(RuntimeError("процессы-воркеры остановлены"))
+
+class EsolllTokenBucket:
+    """🪣 Token bucket: rate токенов в секунду, не больше capacity про запас"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self, now):
+        self.refill(now)
+        self.tokens -= 1
+
+class EsolllTelegramOutbox:
+    """📮 Очередь исходящих запросов Telegram с лимитами на чат и на бота"""
+    PRIORITY_RESULT = 0
+    PRIORITY_STATUS = 1
+    
+    def __init__(self, global_rate=25, chat_rate=1, chat_burst=3, group_rate=20 / 60, max_retries=5):
+        self.global_bucket = EsolllTokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.chat_buckets = {}
+        self.chat_queues = {}
+        self.chat_blocked_until = {}
+        self.busy_chats = set()
+        self.sequence = itertools.count()
+        self.wakeup = None
+        self.scheduler_task = None
+        self.delivery_tasks = set()
+    
+    def get_chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательный chat_id - группа: Telegram разрешает ~20 сообщений в минуту
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = EsolllTokenBucket(rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+    
+    def start(self):
+        if self.scheduler_task is None or self.scheduler_task.done():
+            self.wakeup = asyncio.Event()
+            self.scheduler_task = asyncio.create_task(self.scheduler_loop())
+    
+    async def submit(self, chat_id, request, priority=PRIORITY_RESULT):
+        """Ставит запрос в очередь; request() -> (status, json). Возвращает json ответа или None"""
+        self.start()
+        item = {
+            'seq': next(self.sequence),
+            'priority': priority,
+            'request': request,
+            'future': asyncio.get_running_loop().create_future(),
+            'attempts': 0
+        }
+        self.chat_queues.setdefault(chat_id, collections.deque()).append(item)
+        self.wakeup.set()
+        return await item['future']
+    
+    def pick_next(self, now):
+        """Выбирает следующий запрос: (chat_id, item, 0) или (None, None, сколько ждать)"""
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, None, global_wait
+        
+        best_chat = None
+        best_key = None
+        min_wait = None
+        for chat_id, queue in self.chat_queues.items():
+            # Внутри чата порядок сообщений сохраняется: в полете не больше одного запроса
+            if not queue or chat_id in self.busy_chats:
+                continue
+            wait = max(self.chat_blocked_until.get(chat_id, 0) - now, self.get_chat_bucket(chat_id).wait_time(now))
+            if wait > 0:
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+                continue
+            key = (queue[0]['priority'], queue[0]['seq'])
+            if best_key is None or key < best_key:
+                best_chat, best_key = chat_id, key
+        
+        if best_chat is None:
+            return None, None, min_wait
+        return best_chat, self.chat_queues[best_chat].popleft(), 0
+    
+    async def scheduler_loop(self):
+        while True:
+            now = time.monotonic()
+            chat_id, item, wait = self.pick_next(now)
+            if item is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            self.global_bucket.consume(now)
+            self.get_chat_bucket(chat_id).consume(now)
+            self.busy_chats.add(chat_id)
+            task = asyncio.create_task(self.deliver(chat_id, item))
+            self.delivery_tasks.add(task)
+            task.add_done_callback(self.delivery_tasks.discard)
+    
+    async def deliver(self, chat_id, item):
+        item['attempts'] += 1
+        try:
+            status, payload = await item['request']()
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            status, payload = None, {'description': repr(e)}
+        except Exception as e:
+            # Например, RuntimeError('Session is closed'): попытка засчитана, чат не должен зависнуть
+            print(f"❌ Telegram: неожиданная ошибка запроса в чат {chat_id}: {e!r}")
+            status, payload = None, {'description': repr(e)}
+        
+        try:
+            if item['future'].done():
+                # Отправитель перестал ждать ответ (задача отменена) - повторять запрос незачем
+                pass
+            elif status == 200:
+                item['future'].set_result(payload or {'ok': True})
+            elif status == 429 or status is None or status >= 500:
+                if item['attempts'] > self.max_retries and status != 429:
+                    print(f"❌ Telegram: запрос в чат {chat_id} не доставлен после {item['attempts']} попыток: {payload}")
+                    item['future'].set_result(None)
+                else:
+                    if status == 429:
+                        delay = (payload or {}).get('parameters', {}).get('retry_after', 1)
+                        print(f"⏳ Telegram 429 для чата {chat_id}: повтор через {delay} сек")
+                    else:
+                        delay = min(30, 2 ** (item['attempts'] - 1)) * random.uniform(0.5, 1.0)
+                    self.chat_blocked_until[chat_id] = time.monotonic() + delay
+                    self.chat_queues.setdefault(chat_id, collections.deque()).appendleft(item)
+            else:
+                print(f"❌ Telegram отклонил запрос в чат {chat_id}: {status} {(payload or {}).get('description', '')}")
+                item['future'].set_result(None)
+        finally:
+            self.busy_chats.discard(chat_id)
+            if not self.chat_queues.get(chat_id):
+                self.chat_queues.pop(chat_id, None)
+                self.chat_blocked_until.pop(chat_id, None)
+            self.wakeup.set()
+    
+    def pending(self):
+        return sum(len(queue) for queue in self.chat_queues.values()) + len(self.delivery_tasks)
+    
+    async def close(self, drain_timeout=30):
+        """Досылает очередь (не дольше drain_timeout секунд) и останавливает планировщик"""
+        deadline = time.monotonic() + drain_timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.scheduler_task is not None:
+            self.scheduler_task.cancel()
+            await asyncio.gather(self.scheduler_task, return_exceptions=True)
+            self.scheduler_task = None
+        for queue in self.chat_queues.values():
+            for item in queue:
+                if not item['future'].done():
+                    item['future'].set_result(None)
+        self.chat_queues.clear()
+
+class EsolllProgressMessage:
+    """✏️ Прогресс анализа в одном сообщении, обновляемом через editMessageText"""
+    def __init__(self, bot, chat_id, mode='edit', min_interval=2.0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.mode = mode
+        self.min_interval = min_interval
+        self.message_id = None
+        self.sent_text = None
+        self.pending_text = None
+        self.last_edit = 0
+        self.flush_task = None
+    
+    async def start(self, text):
+        if self.mode == 'edit':
+            self.message_id = await self.bot.send_tracked_message(self.chat_id, text, priority=EsolllTelegramOutbox.PRIORITY_STATUS)
+            if self.message_id is not None:
+                self.sent_text = text
+                self.last_edit = time.monotonic()
+                return True
+        return await self.bot.send_message(self.chat_id, text, priority=EsolllTelegramOutbox.PRIORITY_STATUS)
+    
+    async def update(self, text):
+        if self.message_id is None:
+            await self.bot.send_message(self.chat_id, text, priority=EsolllTelegramOutbox.PRIORITY_STATUS)
+            return
+        self.pending_text = text
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_later())
+    
+    async def flush_later(self):
+        await asyncio.sleep(max(0, self.min_interval - (time.monotonic() - self.last_edit)))
+        await self.flush()
+    
+    async def flush(self):
+        text, self.pending_text = self.pending_text, None
+        if text is None or text == self.sent_text:
+            return True
+        self.last_edit = time.monotonic()
+        if await self.bot.edit_message(self.chat_id, self.message_id, text):
+            self.sent_text = text
+            return True
+        return False
+    
+    async def finish(self, text, priority=EsolllTelegramOutbox.PRIORITY_RESULT):
+        """Финальный текст: правка без задержки (или новое сообщение, если править нечего)"""
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        if self.message_id is None:
+            return await self.bot.send_message(self.chat_id, text, priority=priority)
+        self.pending_text = text
+        if await self.flush():
+            return True
+        # Правка не удалась (например, сообщение удалено) - результат не теряем
+        return await self.bot.send_message(self.chat_id, text, priority=priority)
+
+class EsolllJobJournal:
+    """🗄️ SQLite-журнал бота: offset обновлений, принятые задачи и завершенные этапы"""
+    STAGES = ('accepted', 'product', 'reviews', 'analysis', 'report', 'delivered')
+    
+    def __init__(self, path='esolll_journal.sqlite3', checkpoint_max_age=6 * 3600):
+        self.path = path
+        self.checkpoint_max_age = checkpoint_max_age
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                article_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                article_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (article_id, stage)
+            );
+        """)
+    
+    def get_offset(self):
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'offset'").fetchone()
+        return int(row[0]) if row else 0
+    
+    def set_offset(self, offset):
+        self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('offset', ?)", (str(offset),))
+    
+    def add_job(self, chat_id, article_id):
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO jobs (chat_id, article_id, status, stage, created_at, updated_at) VALUES (?, ?, 'queued', 'accepted', ?, ?)",
+            (chat_id, article_id, now, now)
+        )
+        return cursor.lastrowid
+    
+    def set_job_stage(self, job_id, stage, status='running'):
+        self.conn.execute(
+            "UPDATE jobs SET stage = ?, status = ?, updated_at = ? WHERE job_id = ?",
+            (stage, status, time.time(), job_id)
+        )
+    
+    def finish_job(self, job_id, status='done'):
+        self.conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, time.time(), job_id))
+        row = self.conn.execute("SELECT article_id FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row:
+            pending = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE article_id = ? AND status IN ('queued', 'running')", (row[0],)
+            ).fetchone()[0]
+            if not pending:
+                # Все ожидавшие этот артикул получили результат - чекпоинты больше не нужны
+                self.conn.execute("DELETE FROM checkpoints WHERE article_id = ?", (row[0],))
+    
+    def unfinished_jobs(self):
+        rows = self.conn.execute(
+            "SELECT job_id, chat_id, article_id, stage FROM jobs WHERE status IN ('queued', 'running') ORDER BY job_id"
+        ).fetchall()
+        return [{'job_id': r[0], 'chat_id': r[1], 'article_id': r[2], 'stage': r[3]} for r in rows]
+    
+    def save_checkpoint(self, article_id, stage, data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (article_id, stage, data, updated_at) VALUES (?, ?, ?, ?)",
+            (article_id, stage, json.dumps(data, ensure_ascii=False, default=EsolllReview.json_default), time.time())
+        )
+    
+    def load_checkpoints(self, article_id):
+        rows = self.conn.execute(
+            "SELECT stage, data FROM checkpoints WHERE article_id = ? AND updated_at >= ?",
+            (article_id, time.time() - self.checkpoint_max_age)
+        ).fetchall()
+        return {stage: json.loads(data) for stage, data in rows}
+    
+    def close(self):
+        self.conn.close()
+
+class EsolllAnalysisSubscriber:
+    """👂 Подписчик анализа в single-flight: задача журнала и прогресс, куда идут тексты этапов"""
+    def __init__(self, job_id=None, progress=None):
+        self.job_id = job_id
+        self.progress = progress
+    
+    async def notify(self, text):
+        if self.progress is not None:
+            await self.progress.update(text)
+
+class EsolllSingleFlight:
+    """🔗 Single-flight: одинаковые анализы, запрошенные одновременно, выполняются один раз"""
+    def __init__(self):
+        self.flights = {}
+    
+    def is_running(self, key):
+        return key in self.flights
+    
+    async def run(self, key, subscriber, factory):
+        """Запускает factory(key, subscribers) или подключает подписчика к уже идущему запуску"""
+        flight = self.flights.get(key)
+        if flight is None:
+            subscribers = [subscriber]
+            flight = {
+                'task': asyncio.create_task(factory(key, subscribers)),
+                'subscribers': subscribers
+            }
+            self.flights[key] = flight
+            
+            def release(task):
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+            
+            flight['task'].add_done_callback(release)
+        else:
+            flight['subscribers'].append(subscriber)
+        
+        # shield: отмена одного ожидающего не прерывает общий анализ
+        return await asyncio.shield(flight['task'])
+
+class EsolllStageStats:
+    """⏱️ Скользящая статистика длительности этапов анализа для оценки времени ожидания"""
+    def __init__(self, window=50, default_job_seconds=60):
+        self.window = window
+        self.default_job_seconds = default_job_seconds
+        self.durations = {}
+    
+    def record(self, stage, seconds):
+        self.durations.setdefault(stage, collections.deque(maxlen=self.window)).append(seconds)
+    
+    def average(self, stage):
+        samples = self.durations.get(stage)
+        if not samples:
+            return None
+        return sum(samples) / len(samples)
+    
+    def job_seconds(self):
+        total = self.average('total')
+        return total if total is not None else self.default_job_seconds
+    
+    def estimate_wait(self, position, workers):
+        """Ожидание для задачи на позиции position: сколько «волн» анализов пройдет до нее"""
+        waves = -(-position // max(1, workers))
+        return waves * self.job_seconds()
+    
+    def summary(self):
+        return {stage: round(sum(samples) / len(samples), 1) for stage, samples in self.durations.items() if samples}
+
+ARTICLE_PATTERN = re.compile(r'wildberries\.ru/catalog/(\d+)|\b(\d{6,})\b')
+
+BATCH_STATUS_LABELS = {
+    'not_found': '❌ не найден в MPStats',
+    'no_reviews': '⚠️ отзывы недоступны',
+    'no_data': '⚠️ мало данных для анализа',
+    'mpstats_unavailable': '⚠️ MPStats временно недоступен',
+    'error': '❌ ошибка анализа'
+}
+
+class EsolllLoopMonitor:
+    """⏱️ Задержка event loop и медленные шаги, которые его блокируют"""
+    def __init__(self, interval=0.025, slow_threshold=0.1, window=12000, max_slow=50, log_interval=300, stack_depth=12):
+        # Опоздание пробуждения недооценивает шаг не больше чем на interval - держим его мелким
+        self.interval = min(interval, slow_threshold / 4)
+        self.slow_threshold = slow_threshold
+        self.log_interval = log_interval
+        self.stack_depth = stack_depth
+        self.lags = collections.deque(maxlen=window)
+        self.slow_steps = collections.deque(maxlen=max_slow)
+        self.slow_by_location = {}
+        self.slow_count = 0
+        self.heartbeat = time.monotonic()
+        self.pending_stall = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.loop_thread_id = None
+        self.task = None
+        self.thread = None
+    
+    def start(self):
+        if self.task is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopped.clear()
+        self.task = asyncio.create_task(self.sample_loop())
+        self.thread = threading.Thread(target=self.watchdog, name='esolll-loop-watchdog', daemon=True)
+        self.thread.start()
+        print(f"⏱️ Монитор event loop запущен (медленный шаг > {self.slow_threshold * 1000:.0f} мс)")
+    
+    async def sample_loop(self):
+        last_log = time.monotonic()
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self.heartbeat = now
+            self.lags.append(lag)
+            with self.lock:
+                stall, self.pending_stall = self.pending_stall, None
+            if lag >= self.slow_threshold:
+                self.record_slow(lag, stall)
+            if now - last_log >= self.log_interval:
+                last_log = now
+                print(self.format_log())
+    
+    def watchdog(self):
+        captured_for = None
+        # Стек снимается на половине порога: к концу шага loop может уже проснуться
+        check_every = self.slow_threshold / 8
+        while not self.stopped.wait(check_every):
+            heartbeat = self.heartbeat
+            if captured_for == heartbeat or time.monotonic() - heartbeat < self.interval + self.slow_threshold / 2:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            captured_for = heartbeat
+            stall = (self.location(frame), ''.join(traceback.format_stack(frame, limit=self.stack_depth)))
+            with self.lock:
+                self.pending_stall = stall
+    
+    @staticmethod
+    def location(frame):
+        """Самая глубокая функция этого модуля в стеке: Класс.метод:строка"""
+        innermost = frame
+        while frame is not None:
+            if frame.f_code.co_filename == __file__:
+                code = frame.f_code
+                return f"{getattr(code, 'co_qualname', code.co_name)}:{frame.f_lineno}"
+            frame = frame.f_back
+        return f"{innermost.f_code.co_name} ({os.path.basename(innermost.f_code.co_filename)})"
+    
+    def record_slow(self, lag, stall):
+        # Шаг короче периода проверки сторожа может закончиться раньше, чем снят стек
+        location, stack = stall or ('стек не снят', '')
+        self.slow_count += 1
+        self.slow_steps.append({
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'ms': round(lag * 1000, 1),
+            'location': location,
+            'stack': stack
+        })
+        self.slow_by_location.setdefault(location, collections.deque(maxlen=200)).append(lag)
+        print(f"🐢 Event loop заблокирован на {lag * 1000:.0f} мс: {location}")
+        if stack:
+            print(stack.rstrip())
+    
+    @staticmethod
+    def percentiles(values):
+        ordered = sorted(values)
+        if not ordered:
+            return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+        def pick(q):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 1)
+        return {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(ordered[-1] * 1000, 1)}
+    
+    def summary(self, top=5):
+        """Перцентили в мс: lag_ms - по всем пробуждениям окна, slow_locations - только по медленным шагам"""
+        locations = sorted(self.slow_by_location.items(), key=lambda item: sum(item[1]), reverse=True)[:top]
+        return {
+            'samples': len(self.lags),
+            'lag_ms': self.percentiles(self.lags),
+            'slow_threshold_ms': round(self.slow_threshold * 1000, 1),
+            'slow_steps': self.slow_count,
+            'slow_locations': {
+                location: dict(self.percentiles(lags), count=len(lags)) for location, lags in locations
+            },
+            'recent_slow_steps': [
+                {key: value for key, value in step.items() if key != 'stack'} for step in list(self.slow_steps)[-5:]
+            ]
+        }
     
-    def create_professional_footer(self):
-        return f"""
-        <div class="professional-footer">
-            <div class="footer-content">
-                <div class="footer-section">
-                    <strong>🤖 ESOLLL AI Professional Analytics Engine</strong><br>
-                    Революционная система анализа товаров с искусственным интеллектом
-                </div>
-                <div class="footer-section">
-                    <strong>🆕 Professional возможности:</strong><br>
-                    Семантический анализ • Эмоциональная аналитика • AI-прогнозы • 10 критических отзывов
-                </div>
-                <div class="footer-section">
-                    <strong>👨‍💻 Разработчик: Almas Kasymzhanov</strong><br>
-                    📅 ESOLLL AI Professional от {datetime.now().strftime('%d.%m.%Y')}
-                </div>
-            </div>
-            <div class="footer-note">
-                🧠 Анализ выполнен с использованием передовых алгоритмов машинного обучения и семантического анализа
-            </div>
-        </div>
-        """
+    def format_log(self):
+        summary = self.summary(top=3)
+        lag = summary['lag_ms']
+        line = (f"⏱️ Event loop: задержка p50 {lag['p50']} мс, p95 {lag['p95']} мс, p99 {lag['p99']} мс,"
+                f" max {lag['max']} мс; медленных шагов {summary['slow_steps']}")
+        for location, stats in summary['slow_locations'].items():
+            line += f"\n  🐢 {location}: {stats['count']} раз, p95 {stats['p95']} мс, max {stats['max']} мс"
+        return line
     
-    def generate_error_report(self, article_id):
-        return f"""
-<!DOCTYPE html>
-<html><head><meta charset="UTF-8"><title>ESOLLL AI Professional Error</title></head>
-<body style="text-align: center; padding: 50px; font-family: Arial;">
-<h1>🤖 ESOLLL AI Professional Analytics Engine</h1>
-<h2>⚠️ Недостаточно данных</h2>
-<p>Товар {article_id} - недостаточно данных для профессионального анализа</p>
-</body></html>
-        """
+    async def stop(self):
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.thread is not None:
+            await asyncio.to_thread(self.thread.join, 5)
+            self.thread = None
+
+def extract_article_ids(text):
+    """Все артикулы сообщения (числа из 6+ цифр и ссылки Wildberries) без повторов, в порядке появления"""
+    article_ids = (url_id or plain_id for url_id, plain_id in ARTICLE_PATTERN.findall(text))
+    return list(dict.fromkeys(article_ids))
+
+class EsolllBatchTracker:
+    """📦 Прогресс пакетного анализа: одно сообщение со счетчиком готовых артикулов"""
+    def __init__(self, progress, total):
+        self.progress = progress
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+    
+    def render(self):
+        elapsed = format_wait_time(time.monotonic() - self.started) if self.done else 'только начали'
+        return f"""📦 **Пакетный анализ ESOLLL AI: {self.total} артикулов**
+
+✅ Готово: **{self.done}/{self.total}**{f' (без результата: {self.failed})' if self.failed else ''}
+⏱️ Прошло: {elapsed}
+
+⏳ *Сводная таблица и общий отчет придут после последнего товара...*"""
+    
+    async def item_done(self, status):
+        self.done += 1
+        if status != 'ok':
+            self.failed += 1
+        await self.progress.update(self.render())
+
+def format_wait_time(seconds):
+    if seconds < 60:
+        return f"~{max(5, int(round(seconds / 5.0)) * 5)} сек"
+    return f"~{int(round(seconds / 60.0))} мин"
+
+class EsolllFairQueue:
+    """⚖️ Справедливая очередь анализов: у каждого чата своя очередь, чаты обслуживаются по кругу"""
+    def __init__(self, per_chat_limit=1, per_chat_queue=10):
+        self.per_chat_limit = max(1, per_chat_limit)
+        self.per_chat_queue = per_chat_queue
+        # Свои лимиты отдельных владельцев (пакетов): владелец -> (параллельность, глубина очереди)
+        self.owner_limits = {}
+        # Порядок ключей - порядок обхода по кругу: обслуженный чат уходит в конец
+        self.chat_queues = collections.OrderedDict()
+        self.running = collections.Counter()
+        self.unfinished = 0
+        self.all_done = asyncio.Event()
+        self.all_done.set()
+        self.waiters = collections.deque()
+    
+    def qsize(self):
+        return sum(len(chat_queue) for chat_queue in self.chat_queues.values())
+    
+    def queued_for(self, owner):
+        chat_queue = self.chat_queues.get(owner)
+        return len(chat_queue) if chat_queue else 0
+    
+    def limit_for(self, owner):
+        return self.owner_limits.get(owner, (self.per_chat_limit, self.per_chat_queue))[0]
+    
+    def is_full_for(self, owner):
+        queue_limit = self.owner_limits.get(owner, (self.per_chat_limit, self.per_chat_queue))[1]
+        return queue_limit is not None and self.queued_for(owner) >= queue_limit
+    
+    def can_run(self, owner):
+        return self.running[owner] < self.limit_for(owner)
+    
+    def free_slots(self, owner):
+        return max(0, self.limit_for(owner) - self.running[owner] - self.queued_for(owner))
+    
+    def ready_count(self):
+        """Сколько задач из очереди воркеры могут забрать прямо сейчас с учетом лимитов чатов"""
+        return sum(min(len(chat_queue), self.limit_for(owner) - self.running[owner])
+                   for owner, chat_queue in self.chat_queues.items() if self.can_run(owner))
+    
+    def position_for(self, owner):
+        """Позиция новой задачи чата: k-я задача чата ждет не больше k задач каждого другого чата"""
+        k = self.queued_for(owner) + 1
+        ahead = sum(min(len(chat_queue), k) for chat, chat_queue in self.chat_queues.items() if chat != owner)
+        return ahead + k
+    
+    def put_nowait(self, owner, item):
+        self.chat_queues.setdefault(owner, collections.deque()).append(item)
+        self.unfinished += 1
+        self.all_done.clear()
+        self.wake()
+    
+    def pop_ready(self):
+        for owner, chat_queue in self.chat_queues.items():
+            if not self.can_run(owner):
+                continue
+            item = chat_queue.popleft()
+            if chat_queue:
+                self.chat_queues.move_to_end(owner)
+            else:
+                del self.chat_queues[owner]
+            self.running[owner] += 1
+            return owner, item
+        return None
+    
+    async def get(self):
+        """Следующая задача (чат, задача) по кругу среди чатов, не упершихся в лимит параллельности"""
+        while True:
+            entry = self.pop_ready()
+            if entry is not None:
+                return entry
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+    
+    def wake(self):
+        # Будим всех ожидающих: каждый сам перепроверит, есть ли доступная задача
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+    
+    def task_done(self, owner):
+        self.running[owner] -= 1
+        if self.running[owner] <= 0:
+            del self.running[owner]
+        self.unfinished -= 1
+        if self.unfinished <= 0:
+            self.all_done.set()
+        self.wake()
+    
+    async def join(self):
+        await self.all_done.wait()
+
+class EsolllUpdateDispatcher:
+    """⚡ Диспетчер обновлений: команды отвечаются сразу, анализы идут в пул воркеров"""
+    def __init__(self, analysis_handler, workers=4, max_queue=50, per_chat_concurrency=1, per_chat_queue=10):
+        self.analysis_handler = analysis_handler
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.queue = EsolllFairQueue(per_chat_concurrency, per_chat_queue)
+        self.worker_tasks = []
+        self.background_tasks = set()
+        self.active_jobs = 0
+    
+    def start(self):
+        if self.worker_tasks:
+            return
+        for worker_id in range(1, self.workers + 1):
+            self.worker_tasks.append(asyncio.create_task(self.worker_loop(worker_id)))
+        print(f"⚡ Диспетчер ESOLLL AI: запущено {self.workers} воркеров анализа")
+    
+    def spawn(self, coro):
+        """Запускает быстрый обработчик (команды, ответы) без ожидания очереди анализов"""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+    
+    async def submit(self, owner, *job):
+        """Ставит анализ чата owner в очередь без ограничения глубины и возвращает количество ожидающих задач"""
+        self.start()
+        self.queue.put_nowait(owner, job)
+        return self.queue.qsize()
+    
+    def try_submit(self, owner, *job):
+        """Admission control: сколько задач будет обслужено раньше этой (0 - сразу в работу) или None при переполнении"""
+        self.start()
+        # Задачи, которые сейчас заберут свободные воркеры, не считаются ожидающими
+        if self.queue.qsize() - self.idle_workers() >= self.max_queue or self.queue.is_full_for(owner):
+            return None
+        ready = self.queue.ready_count()
+        if self.queue.free_slots(owner) > 0 and ready < self.idle_workers():
+            self.queue.put_nowait(owner, job)
+            return 0
+        # Задачи, которые свободные воркеры заберут первыми, уже не ждут
+        position = max(1, self.queue.position_for(owner) - min(ready, self.idle_workers()))
+        self.queue.put_nowait(owner, job)
+        return position
+    
+    def idle_workers(self):
+        return max(0, self.workers - self.active_jobs)
+    
+    async def worker_loop(self, worker_id):
+        while True:
+            owner, job = await self.queue.get()
+            self.active_jobs += 1
+            try:
+                await self.analysis_handler(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка воркера ESOLLL AI #{worker_id}: {e}")
+            finally:
+                self.active_jobs -= 1
+                self.queue.task_done(owner)
+    
+    async def stop(self, drain=True):
+        if self.background_tasks:
+            await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        if drain and self.worker_tasks:
+            await self.queue.join()
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
 
 class EsolllAIProfessionalBot:
-    def __init__(self, telegram_token, mpstats_api_key, anthropic_api_key):
+    def __init__(self, telegram_token, mpstats_api_key, anthropic_api_key, analysis_workers=4, progress_mode='edit',
+                 journal_path='esolll_journal.sqlite3', worker_processes=0, worker_concurrency=4, max_queue=50,
+                 per_chat_concurrency=1, per_chat_queue=10, batch_parallelism=4, batch_max_items=50,
+                 product_cache_ttl=1800, product_cache_stale=6 * 3600, product_cache_size=1000,
+                 review_store_path='esolll_reviews.sqlite3', mpstats_retries=2, mpstats_breaker_threshold=5,
+                 mpstats_breaker_reset=30, mpstats_base_url=None, review_sample_scan=20000, russian_share=0.5,
+                 min_review_length=15, cpu_executor='thread', cpu_workers=2, cpu_inline_threshold=4000,
+                 loop_monitor_interval=0.025, slow_step_threshold=0.1):
         self.telegram_token = telegram_token
-        self.parser = EsolllEnhancedParser(mpstats_api_key)
-        self.analyzer = EsolllAIAnalyzer(anthropic_api_key)
+        self.http = EsolllHTTPClient()
+        product_cache_settings = {'ttl': product_cache_ttl, 'stale_ttl': product_cache_stale, 'max_size': product_cache_size}
+        self.product_cache = EsolllTTLCache(**product_cache_settings)
+        self.review_store = EsolllReviewStore(review_store_path, min_review_length=min_review_length) if review_store_path else None
+        mpstats_breaker_settings = {'failure_threshold': mpstats_breaker_threshold, 'reset_timeout': mpstats_breaker_reset}
+        self.parser = EsolllEnhancedParser(
+            mpstats_api_key, http=self.http, product_cache=self.product_cache, review_store=self.review_store,
+            breaker=EsolllCircuitBreaker('MPStats', **mpstats_breaker_settings), max_retries=mpstats_retries,
+            base_url=mpstats_base_url, sample_scan=review_sample_scan, min_review_length=min_review_length
+        )
+        language_settings = {'threshold': russian_share, 'min_length': min_review_length}
+        cpu_settings = {'mode': cpu_executor, 'workers': cpu_workers, 'inline_threshold': cpu_inline_threshold}
+        self.cpu = EsolllCPUExecutor(**cpu_settings)
+        self.analyzer = EsolllAIAnalyzer(
+            anthropic_api_key, http=self.http, language_detector=EsolllLanguageDetector(**language_settings), cpu=self.cpu
+        )
         self.reporter = EsolllAIReporter()
+        self.pipeline = EsolllAnalysisPipeline(self.parser, self.analyzer, self.reporter)
+        self.process_workers = None
+        if worker_processes > 0:
+            self.process_workers = EsolllProcessWorkers(
+                mpstats_api_key, anthropic_api_key, processes=worker_processes, concurrency=worker_concurrency,
+                product_cache=product_cache_settings, review_store_path=review_store_path,
+                mpstats_breaker=mpstats_breaker_settings, mpstats_retries=mpstats_retries,
+                mpstats_base_url=mpstats_base_url, review_sample_scan=review_sample_scan, language=language_settings,
+                cpu_executor=cpu_settings
+            )
+        self.outbox = EsolllTelegramOutbox()
+        self.progress_mode = progress_mode
+        self.progress_interval = 2.0
+        self.analysis_flights = EsolllSingleFlight()
+        self.stage_stats = EsolllStageStats()
+        self.loop_monitor = EsolllLoopMonitor(loop_monitor_interval, slow_step_threshold) if loop_monitor_interval > 0 else None
+        self.dispatcher = EsolllUpdateDispatcher(
+            self.analyze_product_professional, workers=analysis_workers, max_queue=max_queue,
+            per_chat_concurrency=per_chat_concurrency, per_chat_queue=per_chat_queue
+        )
+        # Пакетные анализы: не больше batch_parallelism артикулов пакета одновременно в воркерах диспетчера
+        self.batch_parallelism = max(1, batch_parallelism)
+        self.batch_max_items = batch_max_items
+        self.active_batches = set()
+        self.journal = EsolllJobJournal(journal_path) if journal_path else None
         self.offset = 0
+        # Окно последних update_id webhook: повторные доставки отбрасываются по нему, а не по offset
+        self.recent_updates = collections.deque(maxlen=1000)
+        self.recent_update_ids = set()
         self.running = False
+        self.poll_timeout = 50
+        self.poll_failures = 0
+        self.poll_backoff_base = 1
+        self.poll_backoff_max = 60
     
-    async def send_message(self, chat_id, text, parse_mode='Markdown'):
-        async with aiohttp.ClientSession() as session:
-            url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
-            data = {'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode}
+    async def telegram_request(self, method, json_data=None, form_factory=None, timeout=12):
+        """Один запрос к Bot API: (HTTP статус, json ответа)"""
+        session = await self.http.get_session()
+        url = f"https://api.telegram.org/bot{self.telegram_token}/{method}"
+        data = form_factory() if form_factory else None
+        async with session.post(url, json=json_data, data=data, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
             try:
-                async with session.post(url, json=data, timeout=aiohttp.ClientTimeout(total=12)) as response:
-                    return response.status == 200
-            except:
-                return False
+                payload = await response.json(content_type=None)
+            except ValueError:
+                payload = None
+            return response.status, payload
+    
+    async def send_message(self, chat_id, text, parse_mode='Markdown', priority=EsolllTelegramOutbox.PRIORITY_RESULT):
+        data = {'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode}
+        
+        async def request():
+            return await self.telegram_request('sendMessage', json_data=data)
+        
+        return await self.outbox.submit(chat_id, request, priority) is not None
+    
+    async def send_tracked_message(self, chat_id, text, parse_mode='Markdown', priority=EsolllTelegramOutbox.PRIORITY_RESULT):
+        """Как send_message, но возвращает message_id для последующих правок"""
+        data = {'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode}
+        
+        async def request():
+            return await self.telegram_request('sendMessage', json_data=data)
+        
+        payload = await self.outbox.submit(chat_id, request, priority)
+        if payload and isinstance(payload.get('result'), dict):
+            return payload['result'].get('message_id')
+        return None
+    
+    async def edit_message(self, chat_id, message_id, text, parse_mode='Markdown', priority=EsolllTelegramOutbox.PRIORITY_STATUS):
+        data = {'chat_id': chat_id, 'message_id': message_id, 'text': text, 'parse_mode': parse_mode}
+        
+        async def request():
+            return await self.telegram_request('editMessageText', json_data=data)
+        
+        return await self.outbox.submit(chat_id, request, priority) is not None
+    
+    def create_progress(self, chat_id):
+        return EsolllProgressMessage(self, chat_id, mode=self.progress_mode, min_interval=self.progress_interval)
     
     async def send_document(self, chat_id, file_path, caption=""):
         if not os.path.exists(file_path):
             return False
         
-        async with aiohttp.ClientSession() as session:
-            url = f"https://api.telegram.org/bot{self.telegram_token}/sendDocument"
-            try:
-                with open(file_path, 'rb') as file:
-                    data = aiohttp.FormData()
-                    data.add_field('chat_id', str(chat_id))
-                    data.add_field('document', file, filename=os.path.basename(file_path))
-                    if caption:
-                        data.add_field('caption', caption)
-                    async with session.post(url, data=data, timeout=aiohttp.ClientTimeout(total=35)) as response:
-                        return response.status == 200
-            except Exception as e:
-                print(f"❌ Ошибка отправки документа: {e}")
-                return False
+        with open(file_path, 'rb') as file:
+            document = file.read()
+        
+        def build_form():
+            # FormData одноразовая - собираем заново для каждой попытки
+            data = aiohttp.FormData()
+            data.add_field('chat_id', str(chat_id))
+            data.add_field('document', document, filename=os.path.basename(file_path))
+            if caption:
+                data.add_field('caption', caption)
+            return data
+        
+        async def request():
+            return await self.telegram_request('sendDocument', form_factory=build_form, timeout=35)
+        
+        return await self.outbox.submit(chat_id, request, EsolllTelegramOutbox.PRIORITY_RESULT) is not None
     
-    async def analyze_product_professional(self, article_id, chat_id):
+    async def analyze_product_professional(self, article_id, chat_id, job_id=None, resumed=False, batch_item=None):
+        if batch_item is not None:
+            return await self.analyze_batch_item(article_id, job_id, *batch_item)
+        
         start_msg = f"""🤖 **ESOLLL AI Professional Analytics Engine**
 *Революционный анализ товаров с искусственным интеллектом*
 
@@ -2096,94 +4283,333 @@ class EsolllAIProfessionalBot:
 
 ⏳ *Получаю данные товара...*"""
         
-        await self.send_message(chat_id, start_msg)
+        if resumed:
+            start_msg = "🔄 **Продолжаю анализ после перезапуска бота**\n\n" + start_msg
+        
+        progress = self.create_progress(chat_id)
+        await progress.start(start_msg)
+        job_status = 'failed'
         
         try:
-            product_data = await self.parser.get_product_info(article_id)
+            if self.analysis_flights.is_running(article_id):
+                await progress.update(f"🔗 **Товар {article_id} уже анализируется ESOLLL AI** - подключаю вас к текущему анализу...")
             
-            if not product_data:
+            # Одинаковые артикулы, запрошенные одновременно, анализируются один раз
+            result = await self.analysis_flights.run(
+                article_id, EsolllAnalysisSubscriber(job_id, progress), self.run_analysis_pipeline
+            )
+            job_status = 'done'
+            
+            if result['status'] == 'not_found':
                 error_msg = f"""❌ **Товар не найден**
 
 Товар **{article_id}** не найден в базе MPStats.
 
 🔄 **Попробуйте другой артикул**"""
-                await self.send_message(chat_id, error_msg)
+                await progress.finish(error_msg)
                 return False
             
-            found_msg = f"""✅ **Товар найден!**
-📦 {product_data['name'][:60]}...
-🏷️ Бренд: {product_data['brand']}
-⭐ Рейтинг: {product_data['rating']}/5
-💬 Всего отзывов: {product_data['comments']}
-
-🤖 **Загружаю отзывы для ESOLLL AI анализа...**
-🧠 **Подготавливаю профессиональную аналитику...**"""
-            
-            await self.send_message(chat_id, found_msg)
-            
-            reviews = await self.parser.get_extended_reviews(article_id, target_reviews=120)
-            
-            if not reviews:
+            if result['status'] == 'no_reviews':
                 no_reviews_msg = f"""⚠️ **Отзывы недоступны**
 
 Не удалось загрузить отзывы для ESOLLL AI анализа.
 Проверьте настройки тарифа в MPStats."""
-                await self.send_message(chat_id, no_reviews_msg)
+                await progress.finish(no_reviews_msg)
                 return False
             
-            processing_msg = f"""✅ **Отзывы загружены успешно**
-🤖 **ЗАПУСКАЮ ESOLLL AI PROFESSIONAL ENGINE...**
-🧠 **Семантическая обработка {len(reviews)} отзывов...**
-💭 **Анализ эмоций и настроений покупателей...**
-📝 **Поиск 10 самых критических отзывов...**
+            if result['status'] == 'mpstats_unavailable':
+                unavailable_msg = f"""⚠️ **MPStats временно недоступен**
 
-⚡ *Это займет 30-90 секунд...*"""
-            
-            await self.send_message(chat_id, processing_msg)
-            
-            # ГЛАВНОЕ: запускаем ESOLLL AI Professional анализ
-            analysis = await self.analyzer.analyze_with_esolll_professional(reviews, product_data['name'])
+Сервис данных Wildberries не отвечает, поэтому товар **{article_id}** сейчас не проанализировать.
+🔄 Попробуйте еще раз через {format_wait_time(max(60, result.get('retry_after', 0)))}."""
+                await progress.finish(unavailable_msg)
+                return False
             
-            if not analysis:
+            if result['status'] == 'no_data':
                 no_data_msg = f"""⚠️ **Недостаточно данных для ESOLLL AI анализа**
 
 Нужно больше качественных отзывов для профессионального анализа."""
-                await self.send_message(chat_id, no_data_msg)
+                await progress.finish(no_data_msg)
                 return False
             
-            # Показываем статус ESOLLL AI
-            ai_status_msg = "🤖 **ESOLLL AI PROFESSIONAL АНАЛИЗ ЗАВЕРШЕН!**"
-            if analysis.get("ai_powered"):
-                esolll_ai_analysis = analysis.get("esolll_ai_analysis", {})
-                ai_rating = esolll_ai_analysis.get("esolll_score", {}).get("product_rating", "неопределено")
-                ai_status_msg += f"\n✅ **ESOLLL AI оценка товара: {ai_rating}/10**"
-                ai_status_msg += "\n🧠 **Семантический анализ выполнен**"
-                ai_status_msg += "\n💭 **Эмоциональная аналитика готова**"
-                ai_status_msg += f"\n📝 **Найдено критических отзывов для анализа**"
-            else:
-                ai_status_msg += "\n⚠️ **Использован базовый алгоритм (ESOLLL AI временно недоступен)**"
-            
-            await self.send_message(chat_id, ai_status_msg)
-            
-            risk_data = self.analyzer.calculate_risk_with_esolll_ai(analysis)
-            
-            await self.send_message(chat_id, "🎯 **Создаю профессиональный ESOLLL AI отчет...**")
+            product_data = result['product_data']
+            analysis = result['analysis']
+            risk_data = result['risk_data']
             
-            await self.send_professional_results(chat_id, product_data, analysis, risk_data)
-            await self.create_professional_report(chat_id, analysis, risk_data, article_id, product_data)
+            await self.send_professional_results(chat_id, product_data, analysis, risk_data, progress=progress)
+            await self.create_professional_report(chat_id, analysis, risk_data, article_id, product_data, report_path=result['report_path'])
+            self.record_stage(article_id, [progress], 'delivered')
             
             return True
             
+        except asyncio.CancelledError:
+            # Остановка бота: задача остается в журнале и продолжится после перезапуска
+            job_status = None
+            raise
+            
         except Exception as e:
             print(f"❌ Ошибка ESOLLL AI Professional анализа: {e}")
             error_msg = f"""❌ **Ошибка ESOLLL AI Professional анализа**
 
 Произошла ошибка при анализе товара с искусственным интеллектом.
 Попробуйте повторить через несколько минут."""
-            await self.send_message(chat_id, error_msg)
+            await progress.finish(error_msg)
+            return False
+        
+        finally:
+            if self.journal is not None and job_id is not None and job_status:
+                self.journal.finish_job(job_id, job_status)
+    
+    async def admit_analysis(self, article_id, chat_id, job_id=None):
+        """🚦 Admission control: сразу в работу, в очередь с ETA или вежливый отказ"""
+        if job_id is None and self.journal is not None:
+            job_id = self.journal.add_job(chat_id, article_id)
+        
+        if self.analysis_flights.is_running(article_id):
+            # Артикул уже анализируется - подключаемся без места в очереди
+            self.dispatcher.spawn(self.analyze_product_professional(article_id, chat_id, job_id))
+            return True
+        
+        chat_queue_full = self.dispatcher.queue.is_full_for(chat_id)
+        waiting = self.dispatcher.try_submit(chat_id, article_id, chat_id, job_id)
+        
+        if waiting is None:
+            if job_id is not None:
+                self.journal.finish_job(job_id, 'rejected')
+            if chat_queue_full:
+                busy_msg = f"""⏳ **У вас уже {self.dispatcher.queue.per_chat_queue} артикулов в очереди ESOLLL AI**
+
+Дождитесь результатов по ним и отправьте артикул **{article_id}** еще раз."""
+                await self.send_message(chat_id, busy_msg)
+                return False
+            busy_msg = f"""⏳ **ESOLLL AI сейчас перегружен**
+
+В очереди уже {self.dispatcher.max_queue} анализов, новый запрос не поместится.
+Пожалуйста, отправьте артикул **{article_id}** еще раз через {format_wait_time(self.stage_stats.job_seconds())}."""
+            await self.send_message(chat_id, busy_msg)
+            return False
+        
+        if waiting > 0:
+            eta = self.stage_stats.estimate_wait(waiting, self.dispatcher.workers)
+            queue_msg = f"""🕐 **Артикул {article_id} поставлен в очередь ESOLLL AI**
+
+📋 Позиция в очереди: **{waiting}**
+⏱️ Примерное ожидание: **{format_wait_time(eta)}**
+
+Анализ начнется автоматически."""
+            await self.send_message(chat_id, queue_msg, priority=EsolllTelegramOutbox.PRIORITY_STATUS)
+        return True
+    
+    async def admit_batch(self, article_ids, chat_id, job_ids=None):
+        """📦 Пакет артикулов из одного сообщения: один пакет на чат за раз"""
+        if job_ids is None:
+            job_ids = [self.journal.add_job(chat_id, article_id) if self.journal is not None else None
+                       for article_id in article_ids[:self.batch_max_items]]
+        
+        if chat_id in self.active_batches:
+            for job_id in job_ids:
+                if job_id is not None:
+                    self.journal.finish_job(job_id, 'rejected')
+            await self.send_message(chat_id, """⏳ **Пакетный анализ уже выполняется**
+
+Дождитесь сводного отчета по текущему пакету и отправьте новый список.""")
+            return False
+        
+        skipped = len(article_ids) - self.batch_max_items
+        if skipped > 0:
+            article_ids = article_ids[:self.batch_max_items]
+            await self.send_message(chat_id, f"""⚠️ **В пакете не больше {self.batch_max_items} артикулов**
+
+Анализирую первые {self.batch_max_items}, остальные {skipped} отправьте отдельным сообщением.""",
+                                    priority=EsolllTelegramOutbox.PRIORITY_STATUS)
+        
+        # Регистрируем до первого await задачи, чтобы повторное сообщение увидело пакет
+        self.active_batches.add(chat_id)
+        # Артикулы пакета идут через общую очередь диспетчера отдельным владельцем:
+        # по кругу с другими чатами, не больше batch_parallelism одновременно
+        self.dispatcher.queue.owner_limits[('batch', chat_id)] = (self.batch_parallelism, self.batch_parallelism)
+        self.dispatcher.spawn(self.analyze_batch(article_ids, chat_id, job_ids))
+        return True
+    
+    async def analyze_batch(self, article_ids, chat_id, job_ids=None):
+        """📦 Параллельный анализ пакета: время ответа близко к самому долгому товару, а не к сумме"""
+        progress = self.create_progress(chat_id)
+        tracker = EsolllBatchTracker(progress, len(article_ids))
+        owner = ('batch', chat_id)
+        loop = asyncio.get_running_loop()
+        job_ids = job_ids or [None] * len(article_ids)
+        results = [loop.create_future() for _ in article_ids]
+        
+        try:
+            await progress.start(tracker.render())
+            submitted = []
+            for article_id, job_id, result in zip(article_ids, job_ids, results):
+                # Пакет держит в диспетчере не больше batch_parallelism артикулов, чтобы не занять
+                # общую очередь целиком; при переполнении ждем места, а не идем в обход воркеров
+                while True:
+                    in_flight = [future for future in submitted if not future.done()]
+                    if len(in_flight) < self.batch_parallelism and self.dispatcher.try_submit(
+                            owner, article_id, chat_id, job_id, False, (tracker, result)) is not None:
+                        break
+                    if in_flight:
+                        await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        await asyncio.sleep(1)
+                submitted.append(result)
+            items = [dict(await result, article_id=article_id) for article_id, result in zip(article_ids, results)]
+            
+            chunks = self.format_batch_summary(items)
+            await progress.finish(chunks[0])
+            for chunk in chunks[1:]:
+                await self.send_message(chat_id, chunk)
+            
+            if any(item['status'] == 'ok' for item in items):
+                batch_id = f"{abs(chat_id)}_{int(time.time())}"
+                report_path = await self.pipeline.render_batch_report(items, batch_id)
+                await self.send_document(chat_id, report_path, f"📦 ESOLLL AI Batch Report | {len(items)} товаров")
+            return True
+        
+        except asyncio.CancelledError:
+            raise
+        
+        except Exception as e:
+            print(f"❌ Ошибка пакетного анализа ESOLLL AI: {e}")
+            await progress.finish("""❌ **Ошибка пакетного анализа ESOLLL AI**
+
+Попробуйте отправить список артикулов еще раз через несколько минут.""")
             return False
+        
+        finally:
+            self.active_batches.discard(chat_id)
+            self.dispatcher.queue.owner_limits.pop(owner, None)
+    
+    async def analyze_batch_item(self, article_id, job_id, tracker, result):
+        """Один артикул пакета в воркере диспетчера; итог уходит в future пакета"""
+        try:
+            # Через single-flight: товары, уже анализируемые для других чатов, не считаются повторно.
+            # Этапы пишутся в журнал задачи артикула, а тексты этапов в пакетный статус не идут
+            outcome = await self.analysis_flights.run(
+                article_id, EsolllAnalysisSubscriber(job_id), self.run_analysis_pipeline
+            )
+        except asyncio.CancelledError:
+            # Остановка бота: задача артикула остается в журнале и продолжится после перезапуска
+            if not result.done():
+                result.cancel()
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка пакетного анализа {article_id}: {e}")
+            outcome = {'status': 'error'}
+        if self.journal is not None and job_id is not None:
+            self.journal.finish_job(job_id, 'done' if outcome['status'] != 'error' else 'failed')
+        await tracker.item_done(outcome['status'])
+        if not result.done():
+            result.set_result(outcome)
+    
+    def format_batch_summary(self, items, limit=3500):
+        """Сводная таблица пакета, разбитая на сообщения в пределах лимита Telegram"""
+        ok_count = sum(1 for item in items if item['status'] == 'ok')
+        lines = [f"📦 **СВОДКА ESOLLL AI: {ok_count}/{len(items)} товаров проанализировано**", ""]
+        
+        for index, item in enumerate(items, 1):
+            if item['status'] != 'ok':
+                lines.append(f"{index}. `{item['article_id']}` — {BATCH_STATUS_LABELS.get(item['status'], BATCH_STATUS_LABELS['error'])}")
+                continue
+            product_data = item['product_data']
+            risk_data = item['risk_data']
+            ai_rating = f" | 🤖 {risk_data.get('esolll_ai_rating', 'N/A')}/10" if risk_data.get('esolll_ai_influence') else ""
+            lines.append(f"{index}. `{item['article_id']}` {risk_data['decision_emoji']} **{risk_data['decision']}** | ⭐ {product_data['rating']}{ai_rating} | {product_data['brand']}")
+        
+        if ok_count:
+            lines.extend(["", "📄 **Полный сводный отчет по всем товарам - в файле ниже**"])
+        
+        chunks = [""]
+        for line in lines:
+            if chunks[-1] and len(chunks[-1]) + len(line) + 1 > limit:
+                chunks.append("")
+            chunks[-1] += line + "\n"
+        return [chunk.rstrip() for chunk in chunks]
+    
+    async def notify_subscribers(self, subscribers, text):
+        """Обновляет прогресс анализа во всех чатах, ожидающих этот артикул"""
+        for subscriber in list(subscribers):
+            await subscriber.notify(text)
+    
+    def record_stage(self, article_id, subscribers, stage, data=None):
+        """Сохраняет чекпоинт этапа в журнал и отмечает этап у всех задач этого артикула"""
+        if self.journal is None:
+            return
+        if data is not None:
+            self.journal.save_checkpoint(article_id, stage, data)
+        for subscriber in subscribers:
+            if subscriber.job_id is not None:
+                self.journal.set_job_stage(subscriber.job_id, stage)
+    
+    async def run_analysis_pipeline(self, article_id, subscribers):
+        """🚀 Полный анализ артикула: один прогон на всех подписчиков single-flight"""
+        # После перезапуска продолжаем с последнего завершенного этапа
+        checkpoints = self.journal.load_checkpoints(article_id) if self.journal is not None else {}
+        started = time.monotonic()
+        stage_started = started
+        
+        async def on_stage(stage, data):
+            nonlocal stage_started
+            now = time.monotonic()
+            if stage not in checkpoints:
+                self.stage_stats.record(stage, now - stage_started)
+                self.record_stage(article_id, subscribers, stage, data)
+            stage_started = now
+            
+            if stage == 'product':
+                found_msg = f"""✅ **Товар найден!**
+📦 {data['name'][:60]}...
+🏷️ Бренд: {data['brand']}
+⭐ Рейтинг: {data['rating']}/5
+💬 Всего отзывов: {data['comments']}
+
+🤖 **Загружаю отзывы для ESOLLL AI анализа...**
+🧠 **Подготавливаю профессиональную аналитику...**"""
+                
+                await self.notify_subscribers(subscribers, found_msg)
+            
+            elif stage == 'reviews':
+                processing_msg = f"""✅ **Отзывы загружены успешно**
+🤖 **ЗАПУСКАЮ ESOLLL AI PROFESSIONAL ENGINE...**
+🧠 **Семантическая обработка {len(data)} отзывов...**
+💭 **Анализ эмоций и настроений покупателей...**
+📝 **Поиск 10 самых критических отзывов...**
+
+⚡ *Это займет 30-90 секунд...*"""
+                
+                await self.notify_subscribers(subscribers, processing_msg)
+            
+            elif stage == 'analysis':
+                analysis = data['analysis']
+                
+                # Показываем статус ESOLLL AI
+                ai_status_msg = "🤖 **ESOLLL AI PROFESSIONAL АНАЛИЗ ЗАВЕРШЕН!**"
+                if analysis.get("ai_powered"):
+                    esolll_ai_analysis = analysis.get("esolll_ai_analysis", {})
+                    ai_rating = esolll_ai_analysis.get("esolll_score", {}).get("product_rating", "неопределено")
+                    ai_status_msg += f"\n✅ **ESOLLL AI оценка товара: {ai_rating}/10**"
+                    ai_status_msg += "\n🧠 **Семантический анализ выполнен**"
+                    ai_status_msg += "\n💭 **Эмоциональная аналитика готова**"
+                    ai_status_msg += f"\n📝 **Найдено критических отзывов для анализа**"
+                else:
+                    ai_status_msg += "\n⚠️ **Использован базовый алгоритм (ESOLLL AI временно недоступен)**"
+                
+                await self.notify_subscribers(subscribers, ai_status_msg)
+                await self.notify_subscribers(subscribers, "🎯 **Создаю профессиональный ESOLLL AI отчет...**")
+        
+        if self.process_workers is not None:
+            result = await self.process_workers.run(article_id, checkpoints, on_stage)
+        else:
+            result = await self.pipeline.run(article_id, checkpoints, on_stage)
+        
+        if result['status'] == 'ok' and not checkpoints:
+            self.stage_stats.record('total', time.monotonic() - started)
+        return result
     
-    async def send_professional_results(self, chat_id, product_data, analysis, risk_data):
+    async def send_professional_results(self, chat_id, product_data, analysis, risk_data, progress=None):
         # Основной результат
         esolll_ai_analysis = analysis.get("esolll_ai_analysis", {})
         esolll_score = esolll_ai_analysis.get("esolll_score", {})
@@ -2209,7 +4635,11 @@ class EsolllAIProfessionalBot:
 • 🔮 AI-прогнозы развития ситуации
 • 📝 10 критических отзывов с детальным анализом"""
         
-        await self.send_message(chat_id, summary)
+        if progress is not None:
+            # Итог заменяет статусное сообщение вместо отдельного сообщения
+            await progress.finish(summary)
+        else:
+            await self.send_message(chat_id, summary)
         
         # ESOLLL AI инсайты
         if esolll_ai_analysis:
@@ -2285,20 +4715,65 @@ _{critical_reviews[1]['text'][:200]}..._
             problems_text += "\n📄 **Полный профессиональный отчет ESOLLL AI готовится...**"
             await self.send_message(chat_id, problems_text)
     
-    async def create_professional_report(self, chat_id, analysis, risk_data, article_id, product_data):
+    def product_cache_stats(self):
+        """Счетчики кэша товаров; с процессами-воркерами - сумма по их кэшам"""
+        if self.process_workers is None:
+            return self.product_cache.stats()
+        totals = {'size': 0, 'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'fallbacks': 0}
+        for stats in self.process_workers.worker_stats.values():
+            for name in totals:
+                totals[name] += stats['product_cache'][name]
+        lookups = totals['hits'] + totals['stale_hits'] + totals['misses']
+        totals['hit_rate'] = round((totals['hits'] + totals['stale_hits']) / lookups, 3) if lookups else 0.0
+        return totals
+    
+    def mpstats_breaker_state(self):
+        """Состояние circuit breaker MPStats; с процессами-воркерами - худшее из их состояний"""
+        if self.process_workers is None:
+            return self.parser.breaker.state()
+        states = [stats.get('mpstats_breaker', 'closed') for stats in self.process_workers.worker_stats.values()]
+        for state in ('open', 'half_open'):
+            if state in states:
+                return state
+        return 'closed'
+    
+    def format_stats(self):
+        cache = self.product_cache_stats()
+        breaker_labels = {'closed': '✅ работает', 'half_open': '🔄 проверка восстановления', 'open': '🔌 недоступен'}
+        stats_text = f"""📊 **ESOLLL AI: состояние системы**
+
+⚙️ **Анализы:** в работе {self.dispatcher.active_jobs}, в очереди {self.dispatcher.queue.qsize()} (чатов: {len(self.dispatcher.queue.chat_queues)})
+
+🗃️ **Кэш товаров MPStats:**
+• Записей: {cache['size']}
+• Попадания: {cache['hits']} свежих, {cache['stale_hits']} устаревших (обновлено в фоне: {cache['refreshes']})
+• Промахи: {cache['misses']} (отдано старых записей при сбоях MPStats: {cache['fallbacks']})
+• Hit rate: {cache['hit_rate'] * 100:.1f}%
+
+🌐 **MPStats:** {breaker_labels[self.mpstats_breaker_state()]}"""
+        
+        cpu = self.cpu.stats()
+        stats_text += f"\n🧮 **CPU-задачи ({cpu['mode']}):** в пуле {cpu['offloaded']}, на месте {cpu['inline']}"
+        
+        if self.loop_monitor is not None:
+            loop = self.loop_monitor.summary(top=3)
+            lag = loop['lag_ms']
+            stats_text += f"\n\n⏱️ **Задержка event loop:** p50 {lag['p50']} мс, p95 {lag['p95']} мс, p99 {lag['p99']} мс, max {lag['max']} мс"
+            stats_text += f"\n🐢 **Медленных шагов (> {loop['slow_threshold_ms']:.0f} мс):** {loop['slow_steps']}"
+            for location, step in loop['slow_locations'].items():
+                stats_text += f"\n• `{location}`: {step['count']} раз, p95 {step['p95']} мс"
+        
+        stages = self.stage_stats.summary()
+        if stages:
+            stats_text += "\n\n⏱️ **Средняя длительность этапов:**"
+            for stage, seconds in stages.items():
+                stats_text += f"\n• {stage}: {seconds} сек"
+        return stats_text
+    
+    async def create_professional_report(self, chat_id, analysis, risk_data, article_id, product_data, report_path=None):
         try:
-            reports_dir = f"esolll_ai_professional_reports_{article_id}"
-            os.makedirs(reports_dir, exist_ok=True)
-            
-            print(f"🤖 Создаю ESOLLL AI Professional отчет для {article_id}...")
-            
-            # Генерируем отчет с ESOLLL AI
-            html_content = self.reporter.generate_esolll_ai_report(analysis, risk_data, article_id, product_data)
-            
-            report_path = os.path.join(reports_dir, f"esolll_ai_professional_report_{article_id}.html")
-            
-            with open(report_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            if report_path is None:
+                report_path = await self.pipeline.render_report(analysis, risk_data, article_id, product_data)
             
             esolll_ai_analysis = analysis.get("esolll_ai_analysis", {})
             ai_status = "🤖 POWERED BY ESOLLL AI PROFESSIONAL ENGINE" if analysis.get("ai_powered") else "⚠️ БАЗОВЫЙ АНАЛИЗ (ESOLLL AI недоступен)"
@@ -2352,7 +4827,7 @@ ESOLLL AI анализ выполнен успешно, попробуйте з
             await self.send_message(chat_id, error_msg)
             return False
     
-    async def process_message(self, message):
+    async def process_message(self, message, job_ids=None):
         chat_id = message['chat']['id']
         text = message.get('text', '')
         
@@ -2399,6 +4874,10 @@ ESOLLL AI анализ выполнен успешно, попробуйте з
 • 21676342  
 • 156789123
 
+📦 **ПАКЕТНЫЙ АНАЛИЗ:**
+Отправьте в одном сообщении список артикулов или ссылок Wildberries -
+получите сводную таблицу и общий отчет по всем товарам
+
 🤖 **ЧТО ВЫ ПОЛУЧИТЕ:**
 • ESOLLL AI оценка товара (1-10)
 • 10 самых критических отзывов с анализом
@@ -2475,13 +4954,19 @@ ESOLLL AI анализ выполнен успешно, попробуйте з
             
             await self.send_message(chat_id, info_text)
         
+        elif text == '/stats':
+            await self.send_message(chat_id, self.format_stats())
+        
         else:
-            article_match = re.search(r'\b\d{6,}\b', text)
+            article_ids = extract_article_ids(text)
             
-            if article_match:
-                article_id = article_match.group()
+            if len(article_ids) > 1:
+                print(f"📦 ESOLLL AI пакетный анализ {len(article_ids)} артикулов")
+                await self.admit_batch(article_ids, chat_id, job_ids)
+            elif article_ids:
+                article_id = article_ids[0]
                 print(f"🤖 ESOLLL AI Professional анализ артикула {article_id}")
-                await self.analyze_product_professional(article_id, chat_id)
+                await self.admit_analysis(article_id, chat_id, job_ids[0] if job_ids else None)
             else:
                 error_message = """❌ **Отправьте артикул Wildberries**
 
@@ -2500,24 +4985,82 @@ ESOLLL AI анализ выполнен успешно, попробуйте з
                 
                 await self.send_message(chat_id, error_message)
     
+    def dispatch_update(self, update):
+        """Передает обновление диспетчеру, не блокируя цикл получения обновлений"""
+        if 'message' in update:
+            message = update['message']
+            self.dispatcher.spawn(self.process_message(message, self.register_jobs(message)))
+    
+    def register_jobs(self, message):
+        """Задачи журнала для артикулов сообщения - синхронно, до того как save_offset сохранит offset"""
+        if self.journal is None:
+            return None
+        article_ids = extract_article_ids(message.get('text', ''))[:self.batch_max_items]
+        return [self.journal.add_job(message['chat']['id'], article_id) for article_id in article_ids]
+    
+    def is_duplicate_update(self, update_id):
+        """True для update_id, уже принятого среди последних recent_updates.maxlen обновлений"""
+        if update_id in self.recent_update_ids:
+            return True
+        if len(self.recent_updates) == self.recent_updates.maxlen:
+            self.recent_update_ids.discard(self.recent_updates[0])
+        self.recent_updates.append(update_id)
+        self.recent_update_ids.add(update_id)
+        return False
+    
+    async def save_offset(self):
+        """Фиксирует offset в журнале: задачи принятых обновлений уже записаны в dispatch_update"""
+        if self.journal is None:
+            return
+        self.journal.set_offset(self.offset)
+    
+    async def resume_from_journal(self):
+        """🔄 Восстанавливает offset и ставит в очередь анализы, прерванные перезапуском"""
+        if self.journal is None:
+            return
+        self.offset = max(self.offset, self.journal.get_offset())
+        jobs = self.journal.unfinished_jobs()
+        for job in jobs:
+            await self.dispatcher.submit(job['chat_id'], job['article_id'], job['chat_id'], job['job_id'], True)
+        if jobs:
+            print(f"🔄 Восстановлено незавершенных анализов из журнала: {len(jobs)}")
+    
     async def get_updates(self):
-        async with aiohttp.ClientSession() as session:
-            url = f"https://api.telegram.org/bot{self.telegram_token}/getUpdates"
-            params = {'offset': self.offset, 'timeout': 5}
-            
-            try:
-                async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('ok'):
-                            for update in data['result']:
-                                self.offset = update['update_id'] + 1
-                                if 'message' in update:
-                                    await self.process_message(update['message'])
-                            return True
-                    return False
-            except:
-                return True
+        """Long polling: Telegram держит запрос до poll_timeout секунд и отвечает сразу при новом сообщении"""
+        session = await self.http.get_session()
+        url = f"https://api.telegram.org/bot{self.telegram_token}/getUpdates"
+        params = {
+            'offset': self.offset,
+            'timeout': self.poll_timeout,
+            'allowed_updates': json.dumps(['message'])
+        }
+        
+        try:
+            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=self.poll_timeout + 10)) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    if data.get('ok'):
+                        for update in data['result']:
+                            self.offset = update['update_id'] + 1
+                            self.dispatch_update(update)
+                        if data['result']:
+                            await self.save_offset()
+                        return True
+                elif response.status == 409:
+                    # Активен webhook - getUpdates не работает, пока он не удален
+                    print("⚠️ Telegram: активен webhook, удаляю его для режима polling")
+                    await self.delete_webhook()
+                else:
+                    print(f"⚠️ getUpdates вернул статус {response.status}")
+                return False
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print(f"❌ Ошибка получения обновлений: {e!r}")
+            return False
+    
+    def get_poll_backoff(self):
+        """Экспоненциальная задержка с джиттером после подряд идущих ошибок polling"""
+        delay = min(self.poll_backoff_max, self.poll_backoff_base * (2 ** (self.poll_failures - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
     
     async def run_professional_bot(self, cycles=100):
         print("🤖 ЗАПУСК ESOLLL AI PROFESSIONAL ANALYTICS ENGINE")
@@ -2534,16 +5077,152 @@ ESOLLL AI анализ выполнен успешно, попробуйте з
         print("=" * 80)
         
         self.running = True
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+        self.dispatcher.start()
+        if self.process_workers is not None:
+            self.process_workers.start()
+        await self.resume_from_journal()
         
         for i in range(cycles):
             if not self.running:
                 break
             print(f"🔄 Цикл {i+1}/{cycles} - ESOLLL AI Professional готов к анализу")
-            await self.get_updates()
-            await asyncio.sleep(2)
-        
+            if await self.get_updates():
+                self.poll_failures = 0
+            else:
+                self.poll_failures += 1
+                delay = self.get_poll_backoff()
+                print(f"⏳ Повтор polling через {delay:.1f} сек (ошибок подряд: {self.poll_failures})")
+                await asyncio.sleep(delay)
+        
+        await self.dispatcher.stop()
+        if self.process_workers is not None:
+            await self.process_workers.stop()
+        await self.cpu.shutdown()
+        if self.loop_monitor is not None:
+            await self.loop_monitor.stop()
+        await self.outbox.close()
+        await self.http.close()
+        self.close_storage()
         print("⏹️ ESOLLL AI Professional Bot остановлен")
     
+    async def set_webhook(self, webhook_url, secret_token=None):
+        session = await self.http.get_session()
+        url = f"https://api.telegram.org/bot{self.telegram_token}/setWebhook"
+        data = {'url': webhook_url, 'allowed_updates': ['message']}
+        if secret_token:
+            data['secret_token'] = secret_token
+        try:
+            async with session.post(url, json=data, timeout=aiohttp.ClientTimeout(total=12)) as response:
+                return response.status == 200
+        except Exception as e:
+            print(f"❌ Ошибка установки webhook: {e}")
+            return False
+    
+    async def delete_webhook(self):
+        session = await self.http.get_session()
+        url = f"https://api.telegram.org/bot{self.telegram_token}/deleteWebhook"
+        try:
+            async with session.post(url, timeout=aiohttp.ClientTimeout(total=12)) as response:
+                return response.status == 200
+        except Exception as e:
+            print(f"❌ Ошибка удаления webhook: {e}")
+            return False
+    
+    def create_webhook_app(self, path='/telegram/webhook', secret_token=None):
+        """🌐 aiohttp.web приложение, принимающее обновления Telegram по webhook"""
+        app = web.Application()
+        app['webhook_secret'] = secret_token
+        app.router.add_post(path, self.handle_webhook)
+        app.router.add_get('/health', self.handle_health)
+        return app
+    
+    async def handle_webhook(self, request):
+        secret_token = request.app['webhook_secret']
+        if secret_token and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+            return web.Response(status=403)
+        
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        
+        update_id = update.get('update_id')
+        if not isinstance(update_id, int):
+            return web.Response(status=400)
+        
+        # Telegram повторяет доставку, пока не получит 200, и шлет обновления параллельно:
+        # update_id приходят не по порядку, поэтому offset - только отметка для журнала
+        if not self.is_duplicate_update(update_id):
+            self.offset = max(self.offset, update_id + 1)
+            self.dispatch_update(update)
+            await self.save_offset()
+        
+        return web.Response(text='ok')
+    
+    async def handle_health(self, request):
+        return web.json_response({
+            'status': 'ok',
+            'queued_analyses': self.dispatcher.queue.qsize(),
+            'queued_chats': len(self.dispatcher.queue.chat_queues),
+            'active_analyses': self.dispatcher.active_jobs,
+            'product_cache': self.product_cache_stats(),
+            'mpstats_breaker': self.mpstats_breaker_state(),
+            'event_loop': self.loop_monitor.summary() if self.loop_monitor is not None else None
+        })
+    
+    async def run_webhook_bot(self, webhook_url=None, host='0.0.0.0', port=8080, path='/telegram/webhook', secret_token=None):
+        """🌐 Режим webhook: Telegram сам доставляет обновления в process_message"""
+        print("🌐 ЗАПУСК ESOLLL AI PROFESSIONAL В РЕЖИМЕ WEBHOOK")
+        print("=" * 80)
+        
+        app = self.create_webhook_app(path, secret_token)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        print(f"🌐 Webhook сервер слушает {host}:{port}{path}")
+        
+        if webhook_url:
+            if await self.set_webhook(webhook_url.rstrip('/') + path, secret_token):
+                print(f"✅ Webhook установлен: {webhook_url.rstrip('/')}{path}")
+            else:
+                print("⚠️ Не удалось установить webhook в Telegram")
+        
+        self.running = True
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+        self.dispatcher.start()
+        if self.process_workers is not None:
+            self.process_workers.start()
+        await self.resume_from_journal()
+        
+        try:
+            while self.running:
+                await asyncio.sleep(1)
+        finally:
+            await runner.cleanup()
+            await self.dispatcher.stop()
+            if self.process_workers is not None:
+                await self.process_workers.stop()
+            await self.cpu.shutdown()
+            if self.loop_monitor is not None:
+                await self.loop_monitor.stop()
+            await self.outbox.close()
+            await self.http.close()
+            self.close_storage()
+            print("⏹️ ESOLLL AI Professional Webhook остановлен")
+    
+    def close_storage(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.review_store is not None:
+            self.review_store.close()
+            self.review_store = None
+            self.parser.review_store = None
+    
     def stop(self):
         self.running = False
 
@@ -2618,6 +5297,35 @@ async def start_esolll_ai_professional():
     telegram_token = os.getenv("TELEGRAM_TOKEN", "7379556579:AAHXWwnYjcJpvTvN83nAUs04uHAykoQv-YM")
     mpstats_api_key = os.getenv("MPSTATS_API_KEY", "68528ad55e29e6.1236050249227088a63f52d8d31984bc88a498c4")
     anthropic_api_key = os.getenv("ANTHROPIC_API_KEY", "your-anthropic-key-here")
+    worker_processes = int(os.getenv("ESOLLL_WORKER_PROCESSES", "0"))
+    worker_concurrency = int(os.getenv("ESOLLL_WORKER_CONCURRENCY", "4"))
+    # Диспетчер должен держать занятыми все слоты процессов-воркеров
+    analysis_workers = int(os.getenv("ESOLLL_ANALYSIS_WORKERS", str(max(4, worker_processes * worker_concurrency))))
+    max_queue = int(os.getenv("ESOLLL_MAX_QUEUE", "50"))
+    per_chat_concurrency = int(os.getenv("ESOLLL_PER_CHAT_CONCURRENCY", "1"))
+    per_chat_queue = int(os.getenv("ESOLLL_PER_CHAT_QUEUE", "10"))
+    batch_parallelism = int(os.getenv("ESOLLL_BATCH_PARALLELISM", "4"))
+    batch_max_items = int(os.getenv("ESOLLL_BATCH_MAX_ITEMS", "50"))
+    product_cache_ttl = int(os.getenv("ESOLLL_PRODUCT_CACHE_TTL", "1800"))
+    product_cache_stale = int(os.getenv("ESOLLL_PRODUCT_CACHE_STALE", str(6 * 3600)))
+    product_cache_size = int(os.getenv("ESOLLL_PRODUCT_CACHE_SIZE", "1000"))
+    progress_mode = os.getenv("ESOLLL_PROGRESS_MODE", "edit")
+    journal_path = os.getenv("ESOLLL_JOURNAL_PATH", "esolll_journal.sqlite3")
+    review_store_path = os.getenv("ESOLLL_REVIEW_STORE_PATH", "esolll_reviews.sqlite3")
+    mpstats_retries = int(os.getenv("ESOLLL_MPSTATS_RETRIES", "2"))
+    mpstats_breaker_threshold = int(os.getenv("ESOLLL_MPSTATS_BREAKER_THRESHOLD", "5"))
+    mpstats_breaker_reset = int(os.getenv("ESOLLL_MPSTATS_BREAKER_RESET", "30"))
+    mpstats_base_url = os.getenv("MPSTATS_BASE_URL")
+    review_sample_scan = int(os.getenv("ESOLLL_REVIEW_SAMPLE_SCAN", "20000"))
+    russian_share = float(os.getenv("ESOLLL_RUSSIAN_SHARE", "0.5"))
+    min_review_length = int(os.getenv("ESOLLL_MIN_REVIEW_LENGTH", "15"))
+    # CPU-работа анализа и отчетов: process, thread или inline; анализ короче порога (символов текста) - на месте
+    cpu_executor = os.getenv("ESOLLL_CPU_EXECUTOR", "thread")
+    cpu_workers = int(os.getenv("ESOLLL_CPU_WORKERS", "2"))
+    cpu_inline_threshold = int(os.getenv("ESOLLL_CPU_INLINE_THRESHOLD", "4000"))
+    # Монитор event loop: период замера задержки (0 - выключен) и порог медленного шага, сек
+    loop_monitor_interval = float(os.getenv("ESOLLL_LOOP_MONITOR_INTERVAL", "0.025"))
+    slow_step_threshold = float(os.getenv("ESOLLL_SLOW_STEP_MS", "100")) / 1000
     
     print("🤖 ESOLLL AI PROFESSIONAL ANALYTICS ENGINE")
     print("=" * 80)
@@ -2626,7 +5334,20 @@ async def start_esolll_ai_professional():
     # ... остальной код печати ...
     
     try:
-        bot = EsolllAIProfessionalBot(telegram_token, mpstats_api_key, anthropic_api_key)
+        bot = EsolllAIProfessionalBot(
+            telegram_token, mpstats_api_key, anthropic_api_key,
+            analysis_workers=analysis_workers, progress_mode=progress_mode, journal_path=journal_path,
+            worker_processes=worker_processes, worker_concurrency=worker_concurrency, max_queue=max_queue,
+            per_chat_concurrency=per_chat_concurrency, per_chat_queue=per_chat_queue,
+            batch_parallelism=batch_parallelism, batch_max_items=batch_max_items,
+            product_cache_ttl=product_cache_ttl, product_cache_stale=product_cache_stale,
+            product_cache_size=product_cache_size, review_store_path=review_store_path,
+            mpstats_retries=mpstats_retries, mpstats_breaker_threshold=mpstats_breaker_threshold,
+            mpstats_breaker_reset=mpstats_breaker_reset, mpstats_base_url=mpstats_base_url,
+            review_sample_scan=review_sample_scan, russian_share=russian_share, min_review_length=min_review_length,
+            cpu_executor=cpu_executor, cpu_workers=cpu_workers, cpu_inline_threshold=cpu_inline_threshold,
+            loop_monitor_interval=loop_monitor_interval, slow_step_threshold=slow_step_threshold
+        )
         print("\n✅ ESOLLL AI PROFESSIONAL BOT СОЗДАН!")
         return bot
     except Exception as e:
@@ -2638,6 +5359,14 @@ if __name__ == "__main__":
         bot = await start_esolll_ai_professional()
         if bot:
             print("🚀 ESOLLL AI Professional Bot запущен на Railway!")
-            await bot.run_professional_bot(999999)  # Для 24/7 работы
+            if os.getenv("ESOLLL_MODE", "polling") == "webhook":
+                await bot.run_webhook_bot(
+                    webhook_url=os.getenv("WEBHOOK_URL"),
+                    port=int(os.getenv("PORT", "8080")),
+                    path=os.getenv("WEBHOOK_PATH", "/telegram/webhook"),
+                    secret_token=os.getenv("WEBHOOK_SECRET")
+                )
+            else:
+                await bot.run_professional_bot(999999)  # Для 24/7 работы
     
     asyncio.run(main())
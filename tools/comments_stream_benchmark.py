@@ -0,0 +1,104 @@
+"""⏱️ Бенчмарк разбора ответа MPStats /comments: json.loads против EsolllCommentsStream
+
+Строит синтетический ответ стенда MPStats, режет его на куски по 64 КБ, как
+response.content.iter_chunked в fetch_comments, и печатает время полного
+json.loads, полного потокового разбора и потокового разбора с ранней
+остановкой после limit пригодных отзывов. Перед замером проверяет, что
+разрез ответа на любом байте (внутри чисел, строк и UTF-8) дает те же элементы.
+
+    python tools/comments_stream_benchmark.py
+    python tools/comments_stream_benchmark.py --comments 50000 --limit 120
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EsolllCommentsStream, is_usable_comment
+from mpstats_standin import synthetic_comments
+
+CHUNK_SIZE = 64 * 1024
+
+# Скаляры, которые префиксом похожи на другое значение: 3 из 3.25, -0 из -0.5, 1 из 1e5
+SPLIT_PAYLOAD = json.dumps({
+    'meta': {'comments': 'не массив', 'list': [1, {'comments': [2]}]},
+    'comments': [3.25, -0.5, 1e5, 12, True, False, None, 'строка "с" \\ экранированием ✓',
+                 {'text': 'Отличный товар 👍', 'valuation': 5}, [1.5, -2], 0],
+    'total': 11
+}, ensure_ascii=False).encode('utf-8')
+
+
+def stream_comments(payload, limit=None):
+    """Как read_comments в fetch_comments: (пригодных отзывов, прочитано байт)"""
+    stream = EsolllCommentsStream()
+    usable = 0
+    read = 0
+    for start in range(0, len(payload), CHUNK_SIZE):
+        chunk = payload[start:start + CHUNK_SIZE]
+        read += len(chunk)
+        for comment in stream.feed(chunk):
+            usable += isinstance(comment, dict) and is_usable_comment(comment)
+        if stream.done or (limit is not None and usable >= limit):
+            break
+    return usable, read
+
+
+def check_every_split(payload):
+    """Разрез ответа на два куска на каждом байте и побайтовая подача дают те же элементы"""
+    expected = json.loads(payload)['comments']
+    splits = [[payload[:offset], payload[offset:]] for offset in range(len(payload) + 1)]
+    splits.append([payload[i:i + 1] for i in range(len(payload))])
+    for chunks in splits:
+        stream = EsolllCommentsStream()
+        items = [item for chunk in chunks for item in stream.feed(chunk)]
+        stream.close()
+        assert stream.done and items == expected, f"разрез {[len(c) for c in chunks][:2]}: {items!r}"
+    # Оборванный ответ - ошибка, а не частичный список
+    stream = EsolllCommentsStream()
+    stream.feed(payload[:payload.index(b'-0.5') + 3])
+    try:
+        stream.close()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("оборванный ответ принят как полный")
+    print(f"✂️ Разрезы на каждом из {len(payload)} байт и побайтовая подача: элементы совпадают")
+
+
+def timed(label, func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<22} {best * 1000:8.1f} мс")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк потокового разбора отзывов MPStats")
+    parser.add_argument('--comments', type=int, default=50000)
+    parser.add_argument('--article', default='348518462', help="артикул синтетических отзывов")
+    parser.add_argument('--limit', type=int, default=120, help="пригодных отзывов до ранней остановки")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    check_every_split(SPLIT_PAYLOAD)
+    payload = json.dumps(synthetic_comments(args.article, args.comments), ensure_ascii=False).encode('utf-8')
+    print(f"📦 Ответ: {args.comments} отзывов, {len(payload) / 1e6:.1f} МБ, кусками по {CHUNK_SIZE // 1024} КБ")
+
+    expected = sum(1 for comment in json.loads(payload)['comments'] if is_usable_comment(comment))
+    timed('json.loads', lambda: json.loads(payload), args.repeat)
+    usable, _ = timed('поток, весь ответ', lambda: stream_comments(payload), args.repeat)
+    assert usable == expected, "потоковый разбор потерял отзывы"
+    usable, read = timed(f'поток, limit={args.limit}', lambda: stream_comments(payload, args.limit), args.repeat)
+    print(f"  ранняя остановка: {usable} пригодных отзывов, прочитано {read / 1024:.0f} КБ из {len(payload) / 1024:.0f} КБ")
+    print("✅ Потоковый разбор совпадает с json.loads")
+
+
+if __name__ == "__main__":
+    main()
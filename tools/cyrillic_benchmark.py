@@ -0,0 +1,91 @@
+"""⏱️ Бенчмарк фильтра русских отзывов: циклы по символам против EsolllLanguageDetector
+
+Прогоняет прежний подсчет букв генераторами и таблицы cp1251 детектора по
+синтетическим отзывам стенда MPStats и смешанным текстам (эмодзи, казахский,
+английский), печатает пропускную способность на миллион символов и
+расхождения вердиктов. Расходиться должны только тексты с ё.
+
+    python tools/cyrillic_benchmark.py
+    python tools/cyrillic_benchmark.py --reviews 50000 --threshold 0.6 --min-length 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EsolllLanguageDetector
+from mpstats_standin import synthetic_comments
+
+MIXED_TEXTS = [
+    "Отличный товар 👍👍 всем советую!!! 🔥",
+    "Ещё не пробовала, но всё пришло целым, упаковка норм",
+    "Good quality, fast delivery, recommend to everyone",
+    "Жақсы тауар, бәрі ұнады, рахмет сатушыға",
+    "Размер 42, площадь 2 м² - всё как в описании, доставка ОК",
+    "Купила для дочки. Very nice! Ей очень понравилось 😍",
+    "Ёлка пришла мятая, ёжик на упаковке порван, верните деньги",
+    "商品很好 но доставка долгая",
+]
+
+
+def loops_accepts(text, threshold=0.5, min_length=15, with_yo=False):
+    """Как было в filter_russian_reviews; with_yo - та же логика, но ё тоже русская буква"""
+    if not text or len(text.strip()) < min_length:
+        return False
+    if with_yo:
+        russian_chars = sum(1 for char in text if 'а' <= char.lower() <= 'я' or char.lower() == 'ё')
+    else:
+        russian_chars = sum(1 for char in text if 'а' <= char.lower() <= 'я')
+    total_chars = sum(1 for char in text if char.isalpha())
+    return total_chars > 0 and (russian_chars / total_chars) > threshold
+
+
+def timed(label, func, texts, total_chars):
+    started = time.perf_counter()
+    results = func(texts)
+    elapsed = time.perf_counter() - started
+    per_million = elapsed / total_chars * 1e6
+    print(f"  {label:<10} {elapsed * 1000:8.1f} мс | {per_million * 1000:7.1f} мс на 1M символов"
+          f" | {total_chars / elapsed / 1e6:6.1f} M символов/с")
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк фильтра русских отзывов ESOLLL AI")
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--article', default='348518462', help="артикул синтетических отзывов")
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--min-length', type=int, default=15)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [c['text'] for c in synthetic_comments(args.article, args.reviews)['comments']]
+    # Каждый пятый отзыв разбавлен смешанным текстом: эмодзи и буквы вне cp1251 идут запасным путем
+    texts = [f"{text} {rng.choice(MIXED_TEXTS)}" if i % 5 == 0 else text for i, text in enumerate(texts)]
+    texts += MIXED_TEXTS
+    total_chars = sum(map(len, texts))
+    print(f"📝 Текстов: {len(texts)}, символов: {total_chars}, средняя длина {total_chars / len(texts):.0f}")
+
+    detector = EsolllLanguageDetector(args.threshold, args.min_length)
+    expected, loops_time = timed('циклы', lambda batch: [loops_accepts(text, args.threshold, args.min_length)
+                                                         for text in batch], texts, total_chars)
+    actual, detector_time = timed('таблицы', detector.classify, texts, total_chars)
+    print(f"  ускорение x{loops_time / detector_time:.2f}")
+
+    differences = [text for text, old, new in zip(texts, expected, actual) if old != new]
+    print(f"🔤 Вердиктов изменилось: {len(differences)} (прежний код не считал ё русской буквой)")
+    for text in differences[:3]:
+        print(f"  → {text[:70]}")
+    assert all('ё' in text.lower() for text in differences), "вердикт изменился у текста без ё"
+
+    reference = [loops_accepts(text, args.threshold, args.min_length, with_yo=True) for text in texts]
+    assert actual == reference, "детектор расходится с прежней логикой, учитывающей ё"
+    print("✅ С учетом ё результаты совпадают")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""⏱️ Бенчмарк поиска ключевых слов: вложенные циклы keyword in text против EsolllKeywordAutomaton
+
+Прогоняет оба способа по синтетическим отзывам стенда MPStats, проверяет,
+что результаты совпадают, и печатает время на каждый словарь, а также
+прежний разбор отзыва в три прохода против EsolllReviewEngine.
+
+    python tools/keyword_benchmark.py
+    python tools/keyword_benchmark.py --reviews 10000 --product "Наушники TWS bluetooth"
+    python tools/keyword_benchmark.py --join 1      # короткие отзывы в одну фразу
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EsolllAIAnalyzer, EsolllKeywordAutomaton, EsolllReview, EsolllReviewEngine
+from mpstats_standin import synthetic_comments
+
+NEGATIVE_GROUP = '__negative__'
+
+
+def loops_first_problem(text, problems):
+    """Как было в analyze_with_esolll_professional: первая категория с совпадением"""
+    for problem_name, keywords in problems.items():
+        for keyword in keywords:
+            if keyword in text:
+                return problem_name
+    return None
+
+
+def loops_critical_hits(text, problems, indicators):
+    """Как было в select_top_10_critical_reviews: число разных слов по категориям и индикаторам"""
+    hits = {}
+    for problem_category, keywords in problems.items():
+        matches = sum(1 for keyword in keywords if keyword in text)
+        if matches > 0:
+            hits[problem_category] = matches
+    return hits, sum(1 for indicator in indicators if indicator in text)
+
+
+def loops_review_pass(review, problems, smart_problems, indicators):
+    """Как было до EsolllReviewEngine: фильтр языка, анализ и отбор критических - каждый своим проходом"""
+    text = review.text
+    if not text or len(text.strip()) < 15:
+        return None
+    russian_chars = sum(1 for char in text if 'а' <= char.lower() <= 'я')
+    total_chars = sum(1 for char in text if char.isalpha())
+    if not (total_chars > 0 and (russian_chars / total_chars) > 0.5):
+        return None
+    rating = review.rating
+    bucket = 'critical' if rating <= 3 else 'positive' if rating >= 5 else 'neutral'
+    problem = loops_first_problem(text.lower(), problems)
+    if rating >= 5 or len(text.strip()) < 30:
+        return bucket, problem, None
+    hits, negative_count = loops_critical_hits(text.lower(), smart_problems, indicators)
+    score = sum(matches * 6 for matches in hits.values()) + negative_count * 4
+    score += 20 if rating <= 2 else 15 if rating == 3 else 8
+    score += 5 * (len(text) > 100) + 5 * (len(text) > 200)
+    return bucket, problem, score if score >= 8 else None
+
+
+def automaton_first_problem(text, automaton):
+    return next(iter(automaton.hits(text)), None)
+
+
+def automaton_critical_hits(text, automaton):
+    hits = automaton.hits(text)
+    return {name: count for name, count in hits.items() if name != NEGATIVE_GROUP}, hits.get(NEGATIVE_GROUP, 0)
+
+
+def engine_review_pass(review, engine):
+    verdict = engine.process(review)
+    if verdict is None:
+        return None
+    return verdict.bucket, verdict.problem, verdict.critical['score'] if verdict.critical else None
+
+
+def timed(label, func, texts):
+    started = time.perf_counter()
+    results = [func(text) for text in texts]
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<10} {elapsed * 1000:8.1f} мс ({elapsed / len(texts) * 1e6:.1f} мкс на отзыв)")
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска ключевых слов ESOLLL AI")
+    parser.add_argument('--reviews', type=int, default=10000)
+    parser.add_argument('--product', default="Сушилка для салата центрифуга")
+    parser.add_argument('--article', default='348518462', help="артикул синтетических отзывов")
+    parser.add_argument('--join', type=int, default=3, help="синтетических фраз в одном отзыве (3 ~ 190 символов)")
+    args = parser.parse_args()
+
+    comments = synthetic_comments(args.article, args.reviews * args.join)['comments']
+    groups = [comments[i:i + args.join] for i in range(0, len(comments), args.join)]
+    reviews = [('. '.join(c['text'] for c in group), group[0]['valuation']) for group in groups]
+    texts = [text.lower() for text, _ in reviews]
+    problems = EsolllAIAnalyzer.ENHANCED_PROBLEMS
+    smart_problems = EsolllReviewEngine.smart_problem_categories(args.product)
+    indicators = EsolllReviewEngine.NEGATIVE_INDICATORS
+
+    started = time.perf_counter()
+    problems_automaton = EsolllKeywordAutomaton(problems)
+    critical_automaton = EsolllKeywordAutomaton({**smart_problems, NEGATIVE_GROUP: indicators})
+    print(f"🔧 Сборка автоматов: {(time.perf_counter() - started) * 1000:.1f} мс (один раз на словарь)")
+    print(f"📝 Отзывов: {len(texts)}, средняя длина {sum(map(len, texts)) / len(texts):.0f} символов")
+
+    print("🔎 Категории проблем (анализ):")
+    expected, loops_time = timed('циклы', lambda text: loops_first_problem(text, problems), texts)
+    actual, automaton_time = timed('автомат', lambda text: automaton_first_problem(text, problems_automaton), texts)
+    assert actual == expected, "результаты автомата и циклов расходятся"
+    print(f"  ускорение x{loops_time / automaton_time:.2f}")
+
+    print("🎯 Проблемы и негативные индикаторы (критические отзывы):")
+    expected, loops_time = timed('циклы', lambda text: loops_critical_hits(text, smart_problems, indicators), texts)
+    actual, automaton_time = timed('автомат', lambda text: automaton_critical_hits(text, critical_automaton), texts)
+    assert actual == expected, "результаты автомата и циклов расходятся"
+    print(f"  ускорение x{loops_time / automaton_time:.2f}")
+
+    # Каждый прогон получает свежие объекты отзывов: lower_text не должен браться из кэша прошлого прогона
+    engine = EsolllReviewEngine(problems, smart_problems)
+    print("⚙️ Полный разбор отзыва (язык, группа, проблема, балл критичности):")
+    expected, loops_time = timed('3 прохода', lambda review: loops_review_pass(review, problems, smart_problems, indicators),
+                                 [EsolllReview(text, rating) for text, rating in reviews])
+    actual, automaton_time = timed('движок', lambda review: engine_review_pass(review, engine),
+                                   [EsolllReview(text, rating) for text, rating in reviews])
+    assert actual == expected, "результаты движка и прежнего разбора расходятся"
+    print(f"  ускорение x{loops_time / automaton_time:.2f}")
+    print("✅ Результаты совпадают")
+
+
+if __name__ == "__main__":
+    main()
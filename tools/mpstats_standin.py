@@ -0,0 +1,328 @@
+"""🧪 Локальный стенд MPStats для офлайн-тестов и бенчмарков ESOLLL AI
+
+Отдает /api/wb/get/item/{id} и /api/wb/get/item/{id}/comments из записанных
+фикстур, а для остальных артикулов - синтетические данные. Задержка, доля
+ошибок, 429 и размер ответов настраиваются; отзывы отдаются потоком.
+
+    python tools/mpstats_standin.py serve --port 8098
+    python tools/mpstats_standin.py serve --latency 0.3 --error-rate 0.1 --big 348518462
+    python tools/mpstats_standin.py record 348518462 21676342 --token $MPSTATS_API_KEY
+    python tools/mpstats_standin.py bench --requests 200 --concurrency 20 --big 348518462
+
+Бот и парсер подключаются к стенду через MPSTATS_BASE_URL:
+
+    MPSTATS_BASE_URL=http://127.0.0.1:8098/api/wb/get/item python main.py
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EsolllEnhancedParser, EsolllMPStatsUnavailable
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mpstats_fixtures')
+API_PREFIX = '/api/wb/get/item'
+MPSTATS_URL = 'https://mpstats.io' + API_PREFIX
+
+REVIEW_TEXTS = {
+    1: ['Ужасно, не работает с первого дня, верните деньги',
+        'Пришел бракованный, воняет химией, не советую никому',
+        'Полный обман, товар не соответствует описанию и фото'],
+    2: ['Сломался через неделю, батарея быстро садится',
+        'Размер маленький, ткань тонкая, швы кривые',
+        'Упаковка повреждена, товар помят, разочарован'],
+    3: ['Нормально за свои деньги, но есть неприятный запах',
+        'Качество среднее, пластик дешевый, но работает',
+        'Доставка долгая, в остальном терпимо'],
+    4: ['Хороший товар, но размерная сетка немного не совпадает',
+        'В целом доволен, зарядка держит почти весь день',
+        'Неплохо, хотя упаковка могла быть лучше'],
+    5: ['Отличный товар, всем доволен, рекомендую',
+        'Качество на высоте, пришел быстро, спасибо продавцу',
+        'Прекрасно подошел, буду заказывать еще']
+}
+FOREIGN_TEXTS = ['Good product, fast delivery, recommend', 'Жақсы тауар, бәрі ұнады рахмет']
+RATING_WEIGHTS = [(5, 55), (4, 15), (3, 10), (2, 8), (1, 12)]
+
+
+def synthetic_product(article_id, comments):
+    rnd = random.Random(f"product-{article_id}")
+    return {'item': {
+        'id': int(article_id),
+        'name': f"Синтетический товар {article_id} для стенда ESOLLL AI",
+        'brand': rnd.choice(['Standin', 'Offline Brand', 'Тестовый бренд']),
+        'rating': round(rnd.uniform(3.5, 4.9), 1),
+        'comments': comments,
+        'price': rnd.randint(300, 9000),
+        'final_price': rnd.randint(200, 8000)
+    }}
+
+
+def synthetic_comments(article_id, count):
+    """Детерминированные отзывы: новые первыми, как в ответе MPStats"""
+    rnd = random.Random(f"comments-{article_id}")
+    ratings = [rating for rating, weight in RATING_WEIGHTS for _ in range(weight)]
+    newest = datetime(2025, 1, 1)
+    comments = []
+    for index in range(count):
+        rating = rnd.choice(ratings)
+        roll = rnd.random()
+        if roll < 0.05:
+            text = 'ок'
+        elif roll < 0.1:
+            text = rnd.choice(FOREIGN_TEXTS)
+        else:
+            text = rnd.choice(REVIEW_TEXTS[rating]) + rnd.choice(['', '. ' + rnd.choice(REVIEW_TEXTS[rating]).lower()])
+        comments.append({
+            'id': int(article_id) * 1000000 + index,
+            'text': text,
+            'valuation': rating,
+            'date': (newest - timedelta(minutes=37 * index)).strftime('%Y-%m-%dT%H:%M:%S'),
+            'answer': 'Спасибо за отзыв!' if rnd.random() < 0.2 else ''
+        })
+    return {'comments': comments}
+
+
+class MPStatsStandIn:
+    """Сервер-заменитель MPStats: фикстуры, синтетика и управляемые сбои"""
+    def __init__(self, fixtures_dir=FIXTURES_DIR, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 comments=300, big_ids=(), big_comments=50000, chunk_size=64 * 1024, bandwidth=None, seed=None):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.comments = comments
+        self.big_ids = set(big_ids)
+        self.big_comments = big_comments
+        self.chunk_size = chunk_size
+        self.bandwidth = bandwidth
+        self.random = random.Random(seed)
+        self.payloads = {}
+        self.stats = collections.Counter()
+
+    def fixture_path(self, article_id, kind):
+        suffix = '_comments' if kind == 'comments' else ''
+        return os.path.join(self.fixtures_dir, f"{article_id}{suffix}.json")
+
+    def load_data(self, article_id, kind):
+        path = self.fixture_path(article_id, kind)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        count = self.big_comments if article_id in self.big_ids else self.comments
+        if kind == 'comments':
+            return synthetic_comments(article_id, count)
+        return synthetic_product(article_id, count)
+
+    def load_payload(self, article_id, kind):
+        key = (article_id, kind)
+        if key not in self.payloads:
+            self.payloads[key] = json.dumps(self.load_data(article_id, kind), ensure_ascii=False).encode('utf-8')
+        return self.payloads[key]
+
+    async def simulate_conditions(self):
+        """Задержка и случайные сбои; возвращает готовый ответ-ошибку или None"""
+        if self.latency:
+            await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.stats['errors'] += 1
+            return web.Response(status=502, text='Bad Gateway (standin)')
+        if roll < self.error_rate + self.throttle_rate:
+            self.stats['throttled'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'}, text='Too Many Requests (standin)')
+        return None
+
+    async def stream_body(self, request, body):
+        response = web.StreamResponse(headers={'Content-Type': 'application/json; charset=utf-8'})
+        response.content_length = len(body)
+        await response.prepare(request)
+        try:
+            for start in range(0, len(body), self.chunk_size):
+                chunk = body[start:start + self.chunk_size]
+                await response.write(chunk)
+                self.stats['bytes_sent'] += len(chunk)
+                if self.bandwidth:
+                    await asyncio.sleep(len(chunk) / self.bandwidth)
+            await response.write_eof()
+        except ConnectionResetError:
+            # Парсер набрал нужные отзывы и закрыл соединение - это штатная ранняя остановка
+            self.stats['aborted_streams'] += 1
+        return response
+
+    async def handle_product(self, request):
+        self.stats['product_requests'] += 1
+        failure = await self.simulate_conditions()
+        if failure is not None:
+            return failure
+        article_id = request.match_info['article_id']
+        return web.Response(body=self.load_payload(article_id, 'product'), content_type='application/json')
+
+    async def handle_comments(self, request):
+        self.stats['comments_requests'] += 1
+        failure = await self.simulate_conditions()
+        if failure is not None:
+            return failure
+        article_id = request.match_info['article_id']
+        since = request.query.get('d1')
+        if since:
+            data = self.load_data(article_id, 'comments')
+            comments = [c for c in data['comments'] if (c.get('date') or '')[:10] >= since]
+            body = json.dumps({'comments': comments}, ensure_ascii=False).encode('utf-8')
+        else:
+            body = self.load_payload(article_id, 'comments')
+        return await self.stream_body(request, body)
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_get(API_PREFIX + '/{article_id}', self.handle_product)
+        app.router.add_get(API_PREFIX + '/{article_id}/comments', self.handle_comments)
+        app.router.add_get('/standin/stats', self.handle_stats)
+        return app
+
+    async def start(self, host, port):
+        runner = web.AppRunner(self.create_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def standin_from_args(args):
+    return MPStatsStandIn(
+        fixtures_dir=args.fixtures, latency=args.latency, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, comments=args.comments, big_ids=args.big,
+        big_comments=args.big_comments, bandwidth=args.bandwidth, seed=args.seed
+    )
+
+
+async def serve(args):
+    standin = standin_from_args(args)
+    runner = await standin.start(args.host, args.port)
+    print(f"🧪 Стенд MPStats слушает http://{args.host}:{args.port}{API_PREFIX}")
+    print(f"   MPSTATS_BASE_URL=http://{args.host}:{args.port}{API_PREFIX}")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await runner.cleanup()
+
+
+async def record(args):
+    """Сохраняет настоящие ответы MPStats как фикстуры для стенда"""
+    os.makedirs(args.fixtures, exist_ok=True)
+    headers = {'X-Mpstats-TOKEN': args.token, 'Content-Type': 'application/json'}
+    async with aiohttp.ClientSession(headers=headers) as session:
+        for article_id in args.articles:
+            for kind, url in (('product', f"{MPSTATS_URL}/{article_id}"), ('comments', f"{MPSTATS_URL}/{article_id}/comments")):
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=120)) as response:
+                    if response.status != 200:
+                        print(f"⚠️ {article_id} {kind}: HTTP {response.status}, фикстура не записана")
+                        continue
+                    data = await response.json()
+                path = MPStatsStandIn(args.fixtures).fixture_path(article_id, kind)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                print(f"💾 {article_id} {kind} -> {path}")
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0
+
+
+async def bench(args):
+    """Прогоняет EsolllEnhancedParser через стенд и печатает пропускную способность и задержки"""
+    standin = standin_from_args(args)
+    runner = await standin.start(args.host, args.port)
+    parser = EsolllEnhancedParser('standin-token', base_url=f"http://{args.host}:{args.port}{API_PREFIX}",
+                                  max_retries=args.retries)
+    articles = list(args.big) + [str(100000000 + i) for i in range(args.articles)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    outcomes = collections.Counter()
+
+    async def one(index):
+        article_id = articles[index % len(articles)]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                product = await parser.get_product_info(article_id)
+                if args.full:
+                    reviews = await parser.fetch_comments(article_id)
+                else:
+                    reviews = await parser.get_extended_reviews(article_id, target_reviews=args.target)
+                outcomes['ok' if product and reviews else 'empty'] += 1
+            except EsolllMPStatsUnavailable:
+                outcomes['mpstats_unavailable'] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await parser.http.close()
+        await runner.cleanup()
+
+    latencies.sort()
+    print(f"📊 Запросов: {args.requests} за {elapsed:.2f} сек ({args.requests / elapsed:.1f} анализов/сек, параллельно {args.concurrency})")
+    print(f"⏱️ Товар + отзывы: p50 {percentile(latencies, 0.5) * 1000:.0f} мс, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.0f} мс, max {latencies[-1] * 1000:.0f} мс")
+    print(f"✅ Итоги: {dict(outcomes)} | circuit breaker: {parser.breaker.state()}")
+    print(f"🧪 Стенд: {dict(standin.stats)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд MPStats для ESOLLL AI")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_standin_options(command):
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=8098)
+        command.add_argument('--fixtures', default=FIXTURES_DIR, help="каталог фикстур (из команды record)")
+        command.add_argument('--latency', type=float, default=0.0, help="средняя задержка ответа, сек")
+        command.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 502")
+        command.add_argument('--throttle-rate', type=float, default=0.0, help="доля ответов 429")
+        command.add_argument('--comments', type=int, default=300, help="отзывов у синтетического товара")
+        command.add_argument('--big', action='append', default=[], help="артикул с --big-comments отзывами")
+        command.add_argument('--big-comments', type=int, default=50000)
+        command.add_argument('--bandwidth', type=float, help="скорость отдачи отзывов, байт/сек")
+        command.add_argument('--seed', type=int)
+
+    add_standin_options(commands.add_parser('serve', help="запустить стенд"))
+
+    record_command = commands.add_parser('record', help="записать ответы настоящего MPStats в фикстуры")
+    record_command.add_argument('articles', nargs='+')
+    record_command.add_argument('--token', default=os.getenv('MPSTATS_API_KEY'), required=not os.getenv('MPSTATS_API_KEY'))
+    record_command.add_argument('--fixtures', default=FIXTURES_DIR)
+
+    bench_command = commands.add_parser('bench', help="замерить парсер на стенде")
+    add_standin_options(bench_command)
+    bench_command.add_argument('--requests', type=int, default=100)
+    bench_command.add_argument('--concurrency', type=int, default=10)
+    bench_command.add_argument('--articles', type=int, default=20, help="число синтетических артикулов")
+    bench_command.add_argument('--target', type=int, default=120, help="отзывов на анализ")
+    bench_command.add_argument('--retries', type=int, default=2)
+    bench_command.add_argument('--full', action='store_true', help="читать отзывы целиком, без ранней остановки")
+
+    args = parser.parse_args()
+    try:
+        asyncio.run({'serve': serve, 'record': record, 'bench': bench}[args.command](args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
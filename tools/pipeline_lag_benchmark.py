@@ -0,0 +1,107 @@
+"""⏱️ Задержка event loop на пути анализа артикула: EsolllCPUExecutor inline/thread/process
+
+Прогоняет EsolllAnalysisPipeline (обзор -> анализ -> отчет) по нескольким
+артикулам одновременно: отзывы - синтетика стенда MPStats в том объеме,
+который бот запрашивает у парсера (target_reviews=120), AI-часть заменена
+запасным анализом. Параллельно задача-сэмплер будит event loop каждую
+миллисекунду и запоминает самое долгое опоздание.
+
+    python tools/pipeline_lag_benchmark.py
+    python tools/pipeline_lag_benchmark.py --reviews 2000 --articles 8 --inline-threshold 4000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (EsolllAIAnalyzer, EsolllAIReporter, EsolllAnalysisPipeline, EsolllCPUExecutor,
+                  EsolllReview, is_usable_comment, reviews_text_size)
+from mpstats_standin import synthetic_comments
+
+
+class OfflineAnalyzer(EsolllAIAnalyzer):
+    """Анализатор без обращения к AI: CPU-работа та же, сеть не нужна"""
+    async def analyze_with_esolll_ai(self, reviews, product_name, basic_analysis):
+        return self.create_fallback_analysis()
+
+
+class SyntheticParser:
+    """Парсер, отдающий синтетические отзывы стенда вместо MPStats"""
+    def __init__(self, reviews):
+        self.reviews = reviews
+        self.cache = {}
+
+    async def get_product_info(self, article_id):
+        return {'name': 'Футболка хлопковая', 'brand': 'ESOLLL', 'price': 1490, 'rating': 4.6, 'comments': 12000}
+
+    async def get_extended_reviews(self, article_id, target_reviews=120):
+        # Генерация синтетики - не часть пайплайна: готовим один раз до замера
+        if article_id not in self.cache:
+            comments = synthetic_comments(article_id, self.reviews * 2)['comments']
+            self.cache[article_id] = [EsolllReview.from_comment(c) for c in comments if is_usable_comment(c)][:self.reviews]
+        return self.cache[article_id]
+
+
+async def measure(mode, args):
+    cpu = EsolllCPUExecutor(mode, args.workers, args.inline_threshold)
+    pipeline = EsolllAnalysisPipeline(SyntheticParser(args.reviews), OfflineAnalyzer('offline', cpu=cpu),
+                                      EsolllAIReporter(), cpu)
+    worst = 0.0
+    running = True
+
+    async def sampler():
+        nonlocal worst
+        loop = asyncio.get_running_loop()
+        while running:
+            expected = loop.time() + 0.001
+            await asyncio.sleep(0.001)
+            worst = max(worst, loop.time() - expected)
+
+    for i in range(args.articles):
+        await pipeline.parser.get_extended_reviews(str(348518462 + i))
+    sampling = asyncio.create_task(sampler())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        results = await asyncio.gather(*(pipeline.run(str(348518462 + i)) for i in range(args.articles)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await sampling
+    await cpu.shutdown()
+    assert all(result['status'] == 'ok' and result['report_path'] for result in results), "пайплайн не дошел до отчета"
+    stats = cpu.stats()
+    print(f"  {mode:<8} макс. задержка {worst * 1000:6.1f} мс | всего {elapsed * 1000:7.1f} мс"
+          f" | в пуле {stats['offloaded']}, на месте {stats['inline']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка event loop на пути анализа ESOLLL AI")
+    parser.add_argument('--reviews', type=int, default=120, help="отзывов на артикул (как target_reviews)")
+    parser.add_argument('--articles', type=int, default=4, help="артикулов одновременно")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--inline-threshold', type=int, default=4000, help="как ESOLLL_CPU_INLINE_THRESHOLD")
+    args = parser.parse_args()
+
+    sample = asyncio.run(SyntheticParser(args.reviews).get_extended_reviews('348518462'))
+    print(f"📝 {len(sample)} отзывов на артикул, {reviews_text_size(sample)} символов текста,"
+          f" порог на месте {args.inline_threshold}")
+
+    workdir = tempfile.mkdtemp(prefix='esolll-lag-')
+    cwd = os.getcwd()
+    os.chdir(workdir)  # отчеты пишутся в текущий каталог
+    try:
+        for mode in EsolllCPUExecutor.MODES[::-1]:
+            asyncio.run(measure(mode, args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
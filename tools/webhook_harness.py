@@ -0,0 +1,151 @@
+"""🧪 Локальный стенд webhook-режима ESOLLL AI Professional
+
+Поднимает webhook-сервер бота на localhost (ответы в Telegram не отправляются,
+а печатаются) и отправляет в него поддельные обновления Telegram.
+
+    python tools/webhook_harness.py
+    python tools/webhook_harness.py --updates 200 --concurrency 20
+    python tools/webhook_harness.py --url http://localhost:8080/telegram/webhook --secret s3cret
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EsolllAIProfessionalBot
+
+FAKE_TEXTS = ['/start', '/help', '/info', 'привет', 'артикул 348518462']
+
+
+class RecordingBot(EsolllAIProfessionalBot):
+    """Бот, который записывает запросы к Bot API вместо отправки в Telegram"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outgoing = []
+        self.message_ids = itertools.count(1)
+
+    async def telegram_request(self, method, json_data=None, form_factory=None, timeout=12):
+        if json_data is not None:
+            self.outgoing.append((json_data.get('chat_id'), method, json_data.get('text', '')))
+        else:
+            self.outgoing.append((None, method, '[document]'))
+        return 200, {'ok': True, 'result': {'message_id': next(self.message_ids)}}
+
+
+def make_fake_update(update_id, text):
+    chat_id = 100000 + update_id % 7
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Harness'},
+            'text': text
+        }
+    }
+
+
+async def post_updates(url, updates, secret=None, concurrency=10):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(post(update) for update in updates))
+
+    return latencies, statuses
+
+
+async def wait_for_replies(bot, expected, timeout=30):
+    """Ждет, пока outbox разошлет ответы: лимиты чатов держат их дольше фиксированной паузы"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(bot.outgoing) >= expected and bot.outbox.pending() == 0:
+            return
+        await asyncio.sleep(0.1)
+    print(f"⚠️ За {timeout} сек outbox не опустел: в очереди {bot.outbox.pending()}")
+
+
+def print_latencies(latencies, statuses):
+    latencies.sort()
+    if not latencies:
+        return
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+    print(f"📨 Отправлено обновлений: {len(latencies)} | статусы: {statuses}")
+    print(f"⏱️ Время ответа webhook: p50 {p50:.1f} мс, p95 {p95:.1f} мс, max {latencies[-1] * 1000:.1f} мс")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Поддельные обновления Telegram для webhook ESOLLL AI")
+    parser.add_argument('--url', help="webhook уже запущенного бота (по умолчанию поднимается локальный стенд)")
+    parser.add_argument('--secret', default='harness-secret')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--updates', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--articles', action='store_true', help="включить артикулы (запускает реальный анализ MPStats/AI)")
+    args = parser.parse_args()
+
+    texts = FAKE_TEXTS if args.articles else [text for text in FAKE_TEXTS if not any(ch.isdigit() for ch in text)]
+    updates = [make_fake_update(i + 1, texts[i % len(texts)]) for i in range(args.updates)]
+    # Telegram доставляет обновления параллельно и не по порядку update_id
+    random.Random(args.updates).shuffle(updates)
+    # Повторная доставка одного и того же update_id должна игнорироваться
+    updates.append(updates[0])
+
+    if args.url:
+        latencies, statuses = await post_updates(args.url, updates, args.secret, args.concurrency)
+        print_latencies(latencies, statuses)
+        return
+
+    bot = RecordingBot(
+        os.getenv("TELEGRAM_TOKEN", "harness-token"),
+        os.getenv("MPSTATS_API_KEY", "harness-mpstats"),
+        os.getenv("ANTHROPIC_API_KEY", "harness-anthropic"),
+        journal_path=None,
+        review_store_path=None
+    )
+    path = '/telegram/webhook'
+    server = asyncio.create_task(bot.run_webhook_bot(host='127.0.0.1', port=args.port, path=path, secret_token=args.secret))
+    await asyncio.sleep(0.5)
+
+    try:
+        url = f"http://127.0.0.1:{args.port}{path}"
+        latencies, statuses = await post_updates(url, updates, args.secret, args.concurrency)
+        print_latencies(latencies, statuses)
+
+        # Запрос с неверным секретом должен быть отклонен
+        _, rejected = await post_updates(url, [make_fake_update(10 ** 6, '/start')], 'wrong-secret')
+        print(f"🔒 Неверный секрет: {rejected}")
+
+        await wait_for_replies(bot, args.updates)
+        print(f"💬 Ответов бота записано: {len(bot.outgoing)} (обновлений без дубликатов: {args.updates})")
+        for chat_id, method, text in bot.outgoing[:5]:
+            print(f"  → {method} {chat_id}: {text.splitlines()[0]}")
+        if not args.articles:
+            # Без артикулов на каждое обновление ровно один ответ
+            assert len(bot.outgoing) == args.updates, "ответов меньше, чем обновлений без дубликатов"
+    finally:
+        bot.stop()
+        await server
+
+
+if __name__ == "__main__":
+    asyncio.run(main())